@@ -7,7 +7,9 @@ from .swagger_config import SWAGGER_TEMPLATE
 
 def create_app(config_name='development'):
     """Create and configure the Flask application."""
-    app = Flask(__name__)
+    # Templates live next to the app package, not inside it
+    app = Flask(__name__, template_folder=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates'))
     
     # Load configuration
     app.config.from_object(config[config_name])
@@ -32,7 +34,7 @@ def create_app(config_name='development'):
     def make_shell_context():
         from models.user import User, UserProfile
         from models.service import Service, ServiceStatus, ServiceImage, ServiceOffer, ServiceMessage
-        from models.rating import Rating
+        from models.rating import Rating, ProviderRatingStats
         from models.category import ServiceCategory
         
         return {
@@ -45,6 +47,7 @@ def create_app(config_name='development'):
             'ServiceOffer': ServiceOffer,
             'ServiceMessage': ServiceMessage,
             'Rating': Rating,
+            'ProviderRatingStats': ProviderRatingStats,
             'ServiceCategory': ServiceCategory
         }
     
@@ -59,6 +62,9 @@ def register_blueprints(app):
     from routes.rating_routes import rating_bp
     from routes.notification_routes import notification_bp
     from routes.quote_routes import quote_bp
+    from routes.stream_routes import stream_bp
+    from routes.export_routes import export_bp
+    from routes.search_routes import search_bp
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -67,6 +73,9 @@ def register_blueprints(app):
     app.register_blueprint(rating_bp, url_prefix='/api/ratings')
     app.register_blueprint(notification_bp, url_prefix='/api/notifications')
     app.register_blueprint(quote_bp, url_prefix='/api/quotes')
+    app.register_blueprint(stream_bp, url_prefix='/api/stream')
+    app.register_blueprint(export_bp, url_prefix='/api/admin/exports')
+    app.register_blueprint(search_bp, url_prefix='/api/search')
 
 def register_error_handlers(app):
     """Register error handlers."""
@@ -55,6 +55,10 @@ SWAGGER_TEMPLATE = {
         {
             "name": "Notifications",
             "description": "User notifications"
+        },
+        {
+            "name": "Search",
+            "description": "Full-text search over services and reviews"
         }
     ],
     "definitions": {
@@ -0,0 +1,13 @@
+"""
+Celery worker entry point for MFUA.
+
+Start a worker with ``celery -A celery_worker.celery worker`` and the
+scheduler with ``celery -A celery_worker.celery beat``.
+"""
+
+import os
+from app import create_app
+from extensions.extensions import celery  # noqa: F401
+
+# Create the Flask application; this also configures celery and registers the tasks
+app = create_app(os.environ.get('FLASK_CONFIG', 'default'))
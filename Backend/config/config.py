@@ -1,5 +1,6 @@
 import os
 from datetime import timedelta
+from celery.schedules import crontab
 
 class Config:
     """Base configuration"""
@@ -23,6 +24,12 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS', '2'))  # threads, one SMTP connection each
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE', '1000'))
+    MAIL_ENQUEUE_TIMEOUT = 1.0  # seconds to wait for room before rejecting a message
+    MAIL_MAX_RETRIES = 3
+    MAIL_RETRY_BACKOFF = 1.0  # seconds, doubled after each failed attempt
+    MAIL_CONNECTION_IDLE_TIMEOUT = 30  # close a worker's connection after this long unused
     
     # CORS
     ALLOWED_ORIGINS = ['http://localhost:3000', 'http://127.0.0.1:3000']
@@ -38,9 +45,60 @@ class Config:
     # Redis (for rate limiting and caching)
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     
+    # Cache backend: 'redis' (shared across workers) or 'memory' (per process)
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'redis')
+    CACHE_KEY_PREFIX = 'mfua:'
+    CACHE_MAX_ENTRIES = 10000  # LRU bound of the memory backend
+    RESPONSE_CACHE_TIMEOUT = 300  # seconds; tagged model writes invalidate sooner
+    OFFER_SUMMARY_CACHE_TIMEOUT = 300  # seconds; offer writes invalidate sooner
+    
+    # Realtime event stream (SSE)
+    PUBSUB_BACKEND = os.environ.get('PUBSUB_BACKEND', 'redis')
+    SSE_HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments
+    SSE_RETRY_MS = 5000  # reconnect delay suggested to EventSource clients
+    SSE_REPLAY_LIMIT = 100  # max missed rows of each kind replayed on resume, else a reset event
+    
     # Celery
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
+    CELERY_BEAT_SCHEDULE = {
+        'expire-overdue-services': {
+            'task': 'services.expire_overdue',
+            'schedule': 300.0
+        },
+        'reconcile-unread-counts': {
+            'task': 'notifications.reconcile_unread_counts',
+            'schedule': 300.0
+        },
+        'send-daily-digests': {
+            'task': 'notifications.send_digests',
+            'schedule': crontab(hour=7, minute=0),
+            'args': ('daily',)
+        },
+        'send-weekly-digests': {
+            'task': 'notifications.send_digests',
+            'schedule': crontab(hour=7, minute=0, day_of_week='monday'),
+            'args': ('weekly',)
+        }
+    }
+    
+    # Notification delivery
+    NOTIFICATION_BATCH_SIZE = 100  # notifications per email / push task
+    DIGEST_BATCH_SIZE = 500  # users per digest query and SMTP connection
+    SERVICE_EXPIRY_BATCH_SIZE = 500  # services expired per UPDATE and commit
+    SERVICE_EXPIRY_LOCK_TIMEOUT = 600  # seconds; frees the lock if a worker dies
+    
+    # Bulk exports
+    EXPORT_WATERMARK_OVERLAP = 300  # seconds re-read before since; longer than any write transaction
+    
+    # Provider matching for new services
+    MATCHING_GRID_CELL_KM = 10.0  # side of a spatial grid cell
+    MATCHING_MAX_RADIUS_KM = 100  # service_radius values above this are capped
+    MATCHING_GRID_REBUILD_INTERVAL = 3600  # seconds between full grid reloads
+    MATCHING_GRID_REFRESH_OVERLAP = 60  # seconds re-read on incremental refreshes
+    MATCHING_NOTIFY_LIMIT = 50  # providers notified per new service
+    VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY')
+    VAPID_CLAIMS_EMAIL = os.environ.get('VAPID_CLAIMS_EMAIL')
     
     # API
     API_PREFIX = '/api/v1'
@@ -72,6 +130,10 @@ class DevelopmentConfig(Config):
     
     # Disable rate limiting in development by default
     RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'false').lower() == 'true'
+    
+    # Single-process dev server does not need Redis for caching or pub/sub
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    PUBSUB_BACKEND = os.environ.get('PUBSUB_BACKEND', 'memory')
 
 
 class TestingConfig(Config):
@@ -89,6 +151,10 @@ class TestingConfig(Config):
     # Disable rate limiting in tests
     RATELIMIT_ENABLED = False
     
+    # In-process cache and pub/sub for tests
+    CACHE_BACKEND = 'memory'
+    PUBSUB_BACKEND = 'memory'
+    
     # Disable background tasks during testing
     CELERY_TASK_ALWAYS_EAGER = True
     CELERY_TASK_EAGER_PROPAGATES = True
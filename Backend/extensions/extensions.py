@@ -1,21 +1,28 @@
+from flask import has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
 from flask_migrate import Migrate
 from celery import Celery
-from flasgger import Swagger, LazyString, LazyJSONEncoder
+from flasgger import Swagger, LazyString
 import logging
 import json
 
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+from utils.cache import Cache
+from utils.json_provider import FastJSONProvider
+from utils.pubsub import PubSub
+
 # Initialize extensions
 db = SQLAlchemy()
 jwt = JWTManager()
 mail = Mail()
 migrate = Migrate()
 celery = Celery()
+cache = Cache()
+pubsub = PubSub()
 
 # Initialize Swagger with default config
 swagger_config = {
@@ -48,16 +55,35 @@ limiter = Limiter(
 
 def init_extensions(app):
     """Initialize all Flask extensions"""
-    # Set the custom JSON encoder for Swagger
-    app.json_encoder = LazyJSONEncoder
+    # Fast JSON responses; also resolves flasgger LazyStrings in specs
+    app.json = FastJSONProvider(app)
     
     # Initialize extensions with app
     db.init_app(app)
     jwt.init_app(app)
     mail.init_app(app)
     migrate.init_app(app, db)
+    cache.init_app(app)
+    pubsub.init_app(app)
+    celery.conf.update(
+        broker_url=app.config.get('CELERY_BROKER_URL'),
+        result_backend=app.config.get('CELERY_RESULT_BACKEND'),
+        task_always_eager=app.config.get('CELERY_TASK_ALWAYS_EAGER', False),
+        task_eager_propagates=app.config.get('CELERY_TASK_EAGER_PROPAGATES', False),
+        beat_schedule=app.config.get('CELERY_BEAT_SCHEDULE', {})
+    )
     celery.conf.update(app.config.get('CELERY_CONFIG', {}))
     
+    class ContextTask(celery.Task):
+        """Run tasks inside an app context (reusing the caller's when eager)"""
+        def __call__(self, *args, **kwargs):
+            if has_app_context():
+                return self.run(*args, **kwargs)
+            with app.app_context():
+                return self.run(*args, **kwargs)
+    
+    celery.Task = ContextTask
+    
     # Configure Swagger
     app.config['SWAGGER'] = {
         'title': 'M-FUA Services Platform API',
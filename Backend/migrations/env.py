@@ -90,9 +90,16 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # SQLite full-text search tables (and the shadow tables FTS5 keeps
+    # beside them) are managed by utils.search, not the models' metadata
+    def include_name(name, type_, parent_names):
+        return not (type_ == 'table' and '_fts' in name)
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
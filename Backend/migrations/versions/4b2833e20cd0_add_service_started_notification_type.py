@@ -0,0 +1,28 @@
+"""Add service_started notification type
+
+Revision ID: 4b2833e20cd0
+Revises: dbfece4fb788
+Create Date: 2026-10-16 23:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b2833e20cd0'
+down_revision = 'dbfece4fb788'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Only PostgreSQL stores the enum as a native type; SQLite uses VARCHAR
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE notificationtype ADD VALUE IF NOT EXISTS 'SERVICE_STARTED'")
+
+
+def downgrade():
+    # PostgreSQL cannot drop a value from an enum type; leaving it is harmless
+    pass
@@ -0,0 +1,31 @@
+"""Add notification digest watermark
+
+Revision ID: 7c1e9a52d3f6
+Revises: 4b2833e20cd0
+Create Date: 2026-10-16 23:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1e9a52d3f6'
+down_revision = '4b2833e20cd0'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    if 'last_digest_at' not in _columns('notification_preferences'):
+        with op.batch_alter_table('notification_preferences') as batch_op:
+            batch_op.add_column(sa.Column('last_digest_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('notification_preferences') as batch_op:
+        batch_op.drop_column('last_digest_at')
@@ -0,0 +1,37 @@
+"""Index users and user profiles by updated_at for provider matching
+
+Revision ID: a6d2f8c4e1b9
+Revises: f3c9a7d1b5e4
+Create Date: 2026-10-17 02:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d2f8c4e1b9'
+down_revision = 'f3c9a7d1b5e4'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_users_updated_at', 'users'),
+    ('ix_user_profiles_updated_at', 'user_profiles'),
+]
+
+
+def _existing_indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for name, table in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, ['updated_at'])
+
+
+def downgrade():
+    for name, table in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
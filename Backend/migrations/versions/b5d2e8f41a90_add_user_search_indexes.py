@@ -0,0 +1,54 @@
+"""Add user listing and prefix search indexes
+
+Revision ID: b5d2e8f41a90
+Revises: 7c1e9a52d3f6
+Create Date: 2026-10-17 00:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d2e8f41a90'
+down_revision = '7c1e9a52d3f6'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_users_created_at_id', ['created_at', 'id']),
+    ('ix_users_role_is_active_created_at_id', ['role', 'is_active', 'created_at', 'id']),
+]
+
+# (name, indexed expression); PostgreSQL indexes them with text_pattern_ops
+# so that LIKE 'prefix%' can use them under any collation. Inspectors do not
+# reflect expression indexes, hence IF NOT EXISTS rather than a lookup.
+PATTERN_INDEXES = [
+    ('ix_users_email_lower', 'lower(email)'),
+    ('ix_users_first_name_lower', 'lower(first_name)'),
+    ('ix_users_last_name_lower', 'lower(last_name)'),
+    ('ix_users_phone_pattern', 'phone'),
+]
+
+
+def _existing_indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    existing = _existing_indexes('users')
+    for name, columns in INDEXES:
+        if name not in existing:
+            op.create_index(name, 'users', columns)
+
+    opclass = ' text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else ''
+    for name, expression in PATTERN_INDEXES:
+        op.execute(f'CREATE INDEX IF NOT EXISTS {name} ON users ({expression}{opclass})')
+
+
+def downgrade():
+    for name, _ in reversed(PATTERN_INDEXES):
+        op.drop_index(name, table_name='users')
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='users')
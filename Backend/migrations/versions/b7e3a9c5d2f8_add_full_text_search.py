@@ -0,0 +1,52 @@
+"""Add full-text search over services and rating comments
+
+Revision ID: b7e3a9c5d2f8
+Revises: a6d2f8c4e1b9
+Create Date: 2026-10-17 03:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e3a9c5d2f8'
+down_revision = 'a6d2f8c4e1b9'
+branch_labels = None
+depends_on = None
+
+
+# (table, indexed columns); the PostgreSQL expressions must match
+# utils.search.search_document() for the planner to use the indexes
+SEARCH_INDEXES = [
+    ('services', ['title', 'description']),
+    ('ratings', ['comment']),
+]
+
+
+def _document(columns):
+    return "to_tsvector('english', " + " || ' ' || ".join(f"coalesce({name}, '')" for name in columns) + ")"
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table, columns in SEARCH_INDEXES:
+        if dialect == 'postgresql':
+            op.execute(f'CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} USING gin ({_document(columns)})')
+        elif dialect == 'sqlite':
+            # FTS5 table keyed by the row id, filled from the existing rows;
+            # the models keep it in step from here on
+            op.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts "
+                       f"USING fts5({', '.join(columns)}, tokenize='porter unicode61')")
+            op.execute(f'DELETE FROM {table}_fts')
+            op.execute(f"INSERT INTO {table}_fts (rowid, {', '.join(columns)}) "
+                       f"SELECT id, {', '.join(columns)} FROM {table}")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    for table, _ in reversed(SEARCH_INDEXES):
+        if dialect == 'postgresql':
+            op.drop_index(f'ix_{table}_search', table_name=table)
+        elif dialect == 'sqlite':
+            op.execute(f'DROP TABLE {table}_fts')
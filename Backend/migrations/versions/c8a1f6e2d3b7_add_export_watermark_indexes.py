@@ -0,0 +1,50 @@
+"""Add export watermark column and indexes
+
+Revision ID: c8a1f6e2d3b7
+Revises: b5d2e8f41a90
+Create Date: 2026-10-17 00:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8a1f6e2d3b7'
+down_revision = 'b5d2e8f41a90'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_services_updated_at_id', 'services'),
+    ('ix_ratings_updated_at_id', 'ratings'),
+    ('ix_service_messages_updated_at_id', 'service_messages'),
+    ('ix_notifications_updated_at_id', 'notifications'),
+]
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _existing_indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if 'updated_at' not in _columns('service_messages'):
+        with op.batch_alter_table('service_messages') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute('UPDATE service_messages SET updated_at = created_at')
+
+    for name, table in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, ['updated_at', 'id'])
+
+
+def downgrade():
+    for name, table in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table('service_messages') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,34 @@
+"""Index service messages by (service_id, id)
+
+Revision ID: d4e7b9a2c6f1
+Revises: c8a1f6e2d3b7
+Create Date: 2026-10-17 01:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4e7b9a2c6f1'
+down_revision = 'c8a1f6e2d3b7'
+branch_labels = None
+depends_on = None
+
+
+def _existing_indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    existing = _existing_indexes('service_messages')
+    if 'ix_service_messages_service_id_id' not in existing:
+        op.create_index('ix_service_messages_service_id_id', 'service_messages', ['service_id', 'id'])
+    # Superseded: ids grow with created_at, so (service_id, id) serves the same reads
+    if 'ix_service_messages_service_id_created_at' in existing:
+        op.drop_index('ix_service_messages_service_id_created_at', table_name='service_messages')
+
+
+def downgrade():
+    op.create_index('ix_service_messages_service_id_created_at', 'service_messages', ['service_id', 'created_at'])
+    op.drop_index('ix_service_messages_service_id_id', table_name='service_messages')
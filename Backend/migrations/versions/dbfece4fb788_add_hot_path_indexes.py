@@ -0,0 +1,81 @@
+"""Add hot path indexes and provider rating stats
+
+Revision ID: dbfece4fb788
+Revises:
+Create Date: 2026-10-16 22:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'dbfece4fb788'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns, partial-index predicate)
+INDEXES = [
+    ('ix_services_latitude_longitude', 'services', ['latitude', 'longitude'], None),
+    ('ix_services_created_at_id', 'services', ['created_at', 'id'], None),
+    ('ix_services_client_id_created_at_id', 'services', ['client_id', 'created_at', 'id'], None),
+    ('ix_services_provider_id_status', 'services', ['provider_id', 'status'], None),
+    ('ix_services_category_id_status', 'services', ['category_id', 'status'], None),
+    ('ix_services_pending_created_at_id', 'services', ['created_at', 'id'], "status = 'PENDING'"),
+    ('ix_notifications_user_id_created_at_id', 'notifications', ['user_id', 'created_at', 'id'], None),
+    ('ix_notifications_user_id_unread', 'notifications', ['user_id'], 'NOT read'),
+    ('ix_ratings_provider_id_created_at_id', 'ratings', ['provider_id', 'created_at', 'id'], None),
+    ('ix_service_messages_service_id_created_at', 'service_messages', ['service_id', 'created_at'], None),
+]
+
+
+def _existing_indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Databases bootstrapped with `flask init-db` predate this migration
+    # and have no provider_rating_stats table yet
+    if not sa.inspect(op.get_bind()).has_table('provider_rating_stats'):
+        op.create_table(
+            'provider_rating_stats',
+            sa.Column('provider_id', sa.Integer(), sa.ForeignKey('users.id'), primary_key=True),
+            sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('count_1', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('count_2', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('count_3', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('count_4', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('count_5', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+        op.execute(
+            "INSERT INTO provider_rating_stats "
+            "(provider_id, rating_count, rating_sum, count_1, count_2, count_3, count_4, count_5, updated_at) "
+            "SELECT provider_id, COUNT(id), SUM(rating), "
+            "SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN rating = 4 THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN rating = 5 THEN 1 ELSE 0 END), "
+            "CURRENT_TIMESTAMP FROM ratings GROUP BY provider_id"
+        )
+
+    for name, table, columns, where in INDEXES:
+        if name in _existing_indexes(table):
+            continue
+        kwargs = {}
+        if where:
+            kwargs = {'postgresql_where': sa.text(where), 'sqlite_where': sa.text(where)}
+        op.create_index(name, table, columns, **kwargs)
+
+
+def downgrade():
+    # Upgrades skip whatever `flask init-db` already built; downgrades drop
+    # everything the revision manages, so every revision ends up in the
+    # same state whichever way the database was bootstrapped
+    for name, table, columns, where in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    op.drop_table('provider_rating_stats')
@@ -0,0 +1,47 @@
+"""Add service offer indexes and offer notification types
+
+Revision ID: e2b6c4d8f0a3
+Revises: d4e7b9a2c6f1
+Create Date: 2026-10-17 01:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b6c4d8f0a3'
+down_revision = 'd4e7b9a2c6f1'
+branch_labels = None
+depends_on = None
+
+
+NOTIFICATION_TYPES = ['NEW_OFFER', 'OFFER_ACCEPTED', 'OFFER_REJECTED']
+
+
+def _existing_indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Only PostgreSQL stores the enum as a native type; SQLite uses VARCHAR
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for value in NOTIFICATION_TYPES:
+                op.execute(f"ALTER TYPE notificationtype ADD VALUE IF NOT EXISTS '{value}'")
+
+    existing = _existing_indexes('service_offers')
+    if 'ix_service_offers_service_id_status_amount_id' not in existing:
+        op.create_index('ix_service_offers_service_id_status_amount_id', 'service_offers',
+                        ['service_id', 'status', 'amount', 'id'])
+    if 'ix_service_offers_pending_provider' not in existing:
+        op.create_index('ix_service_offers_pending_provider', 'service_offers',
+                        ['service_id', 'provider_id'], unique=True,
+                        postgresql_where=sa.text("status = 'pending'"),
+                        sqlite_where=sa.text("status = 'pending'"))
+
+
+def downgrade():
+    for name in ('ix_service_offers_pending_provider', 'ix_service_offers_service_id_status_amount_id'):
+        op.drop_index(name, table_name='service_offers')
+    # PostgreSQL cannot drop a value from an enum type; leaving them is harmless
@@ -0,0 +1,37 @@
+"""Add pending-deadline index and service expiry notification type
+
+Revision ID: f3c9a7d1b5e4
+Revises: e2b6c4d8f0a3
+Create Date: 2026-10-17 02:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9a7d1b5e4'
+down_revision = 'e2b6c4d8f0a3'
+branch_labels = None
+depends_on = None
+
+
+def _existing_indexes(table):
+    return {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    # Only PostgreSQL stores the enum as a native type; SQLite uses VARCHAR
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE notificationtype ADD VALUE IF NOT EXISTS 'SERVICE_EXPIRED'")
+
+    if 'ix_services_pending_deadline_id' not in _existing_indexes('services'):
+        op.create_index('ix_services_pending_deadline_id', 'services', ['deadline', 'id'],
+                        postgresql_where=sa.text("status = 'PENDING'"),
+                        sqlite_where=sa.text("status = 'PENDING'"))
+
+
+def downgrade():
+    op.drop_index('ix_services_pending_deadline_id', table_name='services')
+    # PostgreSQL cannot drop a value from an enum type; leaving it is harmless
@@ -1,5 +1,7 @@
 from datetime import datetime
-from extensions.extensions import db
+from sqlalchemy import event, literal, select
+from sqlalchemy.orm import object_session
+from extensions.extensions import db, cache
 
 class ServiceCategory(db.Model):
     __tablename__ = 'service_categories'
@@ -19,7 +21,13 @@ class ServiceCategory(db.Model):
     # Relationships
     services = db.relationship('Service', backref='category', lazy=True)
     
-    def to_dict(self):
+    # Guards the recursive queries against a parent_id cycle
+    MAX_DEPTH = 32
+    
+    def to_dict(self, has_children=None):
+        """Serialize; pass has_children (e.g. from parent_ids()) to avoid loading subcategories"""
+        if has_children is None:
+            has_children = len(self.subcategories) > 0 if self.subcategories else False
         return {
             'id': self.id,
             'name': self.name,
@@ -27,7 +35,7 @@ class ServiceCategory(db.Model):
             'icon': self.icon,
             'is_active': self.is_active,
             'parent_id': self.parent_id,
-            'has_children': len(self.subcategories) > 0 if self.subcategories else False,
+            'has_children': has_children,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -48,26 +56,82 @@ class ServiceCategory(db.Model):
             query = query.filter_by(is_active=True)
         return query.all()
     
+    @classmethod
+    def parent_ids(cls):
+        """Ids of every category that has at least one subcategory"""
+        return {parent_id for parent_id, in db.session.query(cls.parent_id).filter(
+            cls.parent_id.isnot(None)
+        ).distinct()}
+    
+    @classmethod
+    def subtree_ids(cls, category_id):
+        """
+        Select of category_id and the ids of all its descendants, as a
+        recursive CTE usable in an IN filter
+        """
+        subtree = select(cls.id, literal(0).label('depth')).where(
+            cls.id == category_id
+        ).cte('category_subtree', recursive=True)
+        subtree = subtree.union_all(
+            select(cls.id, subtree.c.depth + 1).where(
+                cls.parent_id == subtree.c.id,
+                subtree.c.depth < cls.MAX_DEPTH
+            )
+        )
+        return select(subtree.c.id)
+    
     def get_ancestors(self):
-        """Get all ancestors of this category"""
-        ancestors = []
-        current = self.parent
-        while current:
-            ancestors.append(current)
-            current = current.parent
-        return ancestors
+        """Get all ancestors of this category, nearest first, in one query"""
+        if self.parent_id is None:
+            return []
+        ancestors = select(ServiceCategory.id, ServiceCategory.parent_id, literal(1).label('depth')).where(
+            ServiceCategory.id == self.parent_id
+        ).cte('category_ancestors', recursive=True)
+        ancestors = ancestors.union_all(
+            select(ServiceCategory.id, ServiceCategory.parent_id, ancestors.c.depth + 1).where(
+                ServiceCategory.id == ancestors.c.parent_id,
+                ancestors.c.depth < self.MAX_DEPTH
+            )
+        )
+        return ServiceCategory.query.join(ancestors, ServiceCategory.id == ancestors.c.id).order_by(
+            ancestors.c.depth
+        ).all()
     
     def get_descendants(self, include_self=False):
-        """Get all descendants of this category"""
-        descendants = []
-        
-        def _get_children(category):
-            for child in category.subcategories:
-                descendants.append(child)
-                _get_children(child)
-        
-        if include_self:
-            descendants.append(self)
+        """Get all descendants of this category in one query"""
+        query = ServiceCategory.query.filter(ServiceCategory.id.in_(self.subtree_ids(self.id)))
+        if not include_self:
+            query = query.filter(ServiceCategory.id != self.id)
+        return query.order_by(ServiceCategory.parent_id, ServiceCategory.name).all()
+    
+    @classmethod
+    def get_tree(cls, include_inactive=False):
+        """
+        Nested list of root categories, each with its 'children', built from a
+        single query. Children of inactive categories are left out with them.
+        """
+        query = cls.query
+        if not include_inactive:
+            query = query.filter_by(is_active=True)
+        categories = query.order_by(cls.name).all()
         
-        _get_children(self)
-        return descendants
+        parent_ids = {c.parent_id for c in categories if c.parent_id is not None}
+        nodes = {c.id: dict(c.to_dict(has_children=c.id in parent_ids), children=[]) for c in categories}
+        roots = []
+        for category in categories:
+            node = nodes[category.id]
+            if category.parent_id is None:
+                roots.append(node)
+            elif category.parent_id in nodes:
+                nodes[category.parent_id]['children'].append(node)
+        return roots
+
+
+@event.listens_for(ServiceCategory, 'after_insert')
+@event.listens_for(ServiceCategory, 'after_update')
+@event.listens_for(ServiceCategory, 'after_delete')
+def _category_changed(mapper, connection, target):
+    # Drops cached category responses, including the tree
+    session = object_session(target)
+    if session is not None:
+        cache.bump_tags_after_commit(session, 'categories')
@@ -1,15 +1,27 @@
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
 from enum import Enum
-from extensions.extensions import db
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session, column_property, object_session
+from extensions.extensions import db, cache, pubsub
+from utils.fieldsets import select_fields
+from utils.pubsub import user_channel
 
 class NotificationType(Enum):
     """Types of notifications"""
     # Service related
     SERVICE_REQUESTED = 'service_requested'
     SERVICE_ACCEPTED = 'service_accepted'
+    SERVICE_STARTED = 'service_started'
     SERVICE_REJECTED = 'service_rejected'
     SERVICE_COMPLETED = 'service_completed'
     SERVICE_CANCELLED = 'service_cancelled'
+    SERVICE_EXPIRED = 'service_expired'
+    
+    # Offer related
+    NEW_OFFER = 'new_offer'
+    OFFER_ACCEPTED = 'offer_accepted'
+    OFFER_REJECTED = 'offer_rejected'
     
     # Rating related
     NEW_RATING = 'new_rating'
@@ -33,6 +45,7 @@ class NotificationPreference(db.Model):
     # Email preferences
     email_enabled = db.Column(db.Boolean, default=True)
     email_frequency = db.Column(db.String(20), default='immediate')  # immediate, daily, weekly
+    last_digest_at = db.Column(db.DateTime, nullable=True)  # end of the window covered by the last digest
     
     # Push notification preferences
     push_enabled = db.Column(db.Boolean, default=True)
@@ -49,6 +62,64 @@ class NotificationPreference(db.Model):
     # Relationships
     user = db.relationship('User', backref=db.backref('notification_preferences', uselist=False))
     
+    # Preference toggle governing each notification type; other types always go out
+    TYPE_TOGGLES = {
+        NotificationType.SERVICE_REQUESTED: 'service_updates',
+        NotificationType.SERVICE_ACCEPTED: 'service_updates',
+        NotificationType.SERVICE_STARTED: 'service_updates',
+        NotificationType.SERVICE_REJECTED: 'service_updates',
+        NotificationType.SERVICE_COMPLETED: 'service_updates',
+        NotificationType.SERVICE_CANCELLED: 'service_updates',
+        NotificationType.SERVICE_EXPIRED: 'service_updates',
+        NotificationType.NEW_OFFER: 'service_updates',
+        NotificationType.OFFER_ACCEPTED: 'service_updates',
+        NotificationType.OFFER_REJECTED: 'service_updates',
+        NotificationType.NEW_MESSAGE: 'new_messages',
+        NotificationType.NEW_RATING: 'rating_updates',
+        NotificationType.RATING_RESPONSE: 'rating_updates',
+        NotificationType.PROMOTION: 'promotions',
+    }
+    
+    # NotificationPreferenceSchema field -> column
+    SCHEMA_FIELDS = {
+        'email_enabled': 'email_enabled',
+        'email_frequency': 'email_frequency',
+        'push_enabled': 'push_enabled',
+        'service_updates': 'service_updates',
+        'messages': 'new_messages',
+        'rating_updates': 'rating_updates',
+        'promotions': 'promotions',
+    }
+    
+    DIGEST_PERIODS = {
+        'daily': timedelta(days=1),
+        'weekly': timedelta(weeks=1),
+    }
+    
+    def _flag(self, name):
+        # Unsaved defaults are still None, so treat them as the column default
+        value = getattr(self, name)
+        if value is None:
+            return self.__table__.c[name].default.arg
+        return value
+    
+    def allows(self, notification_type):
+        """Whether the user wants notifications of this type at all"""
+        toggle = self.TYPE_TOGGLES.get(notification_type)
+        return toggle is None or bool(self._flag(toggle))
+    
+    def wants_immediate_email(self):
+        return bool(self._flag('email_enabled')) and self._flag('email_frequency') == 'immediate'
+    
+    def wants_push(self):
+        return bool(self._flag('push_enabled'))
+    
+    @classmethod
+    def for_users(cls, user_ids):
+        """Preferences keyed by user id, with unsaved defaults for users who have none"""
+        found = {p.user_id: p for p in cls.query.filter(cls.user_id.in_(user_ids)).all()}
+        return {user_id: found.get(user_id) or cls(user_id=user_id) for user_id in user_ids}
+    
     def to_dict(self):
         return {
             'email_enabled': self.email_enabled,
@@ -77,8 +148,8 @@ class Notification(db.Model):
     related_entity_type = db.Column(db.String(50))  # e.g., 'service', 'message', 'rating'
     related_entity_id = db.Column(db.Integer)  # ID of the related entity
     
-    # Read status
-    read = db.Column(db.Boolean, default=False)
+    # Read status (active_history so read/unread flips can adjust the cached counter)
+    read = column_property(db.Column(db.Boolean, default=False), active_history=True)
     read_at = db.Column(db.DateTime, nullable=True)
     
     # Metadata
@@ -88,8 +159,25 @@ class Notification(db.Model):
     # Relationships
     user = db.relationship('User', backref=db.backref('notifications', lazy=True))
     
-    def to_dict(self):
-        return {
+    __table_args__ = (
+        # Keyset pagination of a user's notifications
+        db.Index('ix_notifications_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        # Incremental analytics exports
+        db.Index('ix_notifications_updated_at_id', 'updated_at', 'id'),
+        # Unread counts and mark-all-read; partial so read history does not bloat it
+        db.Index('ix_notifications_user_id_unread', 'user_id',
+                 postgresql_where=db.text('NOT read'),
+                 sqlite_where=db.text('NOT read')),
+    )
+    
+    # Keys to_dict() can render, for the fields= query parameter
+    FIELDS = (
+        'id', 'title', 'message', 'type', 'related_entity_type', 'related_entity_id',
+        'read', 'created_at', 'read_at',
+    )
+    
+    def to_dict(self, fields=None):
+        return select_fields({
             'id': self.id,
             'title': self.title,
             'message': self.message,
@@ -99,7 +187,119 @@ class Notification(db.Model):
             'read': self.read,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'read_at': self.read_at.isoformat() if self.read_at else None
-        }
+        }, fields)
+    
+    @staticmethod
+    def unread_count_key(user_id):
+        return f'notifications:unread:{user_id}'
+    
+    @classmethod
+    def count_unread(cls, user_id):
+        """Count unread notifications in the database"""
+        return cls.query.filter_by(user_id=user_id, read=False).count()
+    
+    @classmethod
+    def get_unread_count(cls, user_id):
+        """Get the unread count from the cache, loading it from the database on a miss"""
+        key = cls.unread_count_key(user_id)
+        count = cache.get(key)
+        if count is None:
+            count = cls.count_unread(user_id)
+            # add() rather than set() so a counter populated concurrently is kept
+            cache.add(key, count)
+        return count
+    
+    @classmethod
+    def adjust_unread_count(cls, user_id, delta):
+        """Apply a delta to a cached counter; a missing counter is loaded lazily later"""
+        if delta:
+            cache.incr(cls.unread_count_key(user_id), delta)
+    
+    @classmethod
+    def digest_query(cls, frequency, cutoff):
+        """
+        (Notification, NotificationPreference) rows for a digest run, ordered
+        by user then age so they can be grouped while streaming.
+        
+        Each user's window starts where their previous digest ended (or one
+        period before cutoff) and is a range scan on the (user_id, created_at)
+        index.
+        """
+        period = NotificationPreference.DIGEST_PERIODS[frequency]
+        window_start = func.coalesce(NotificationPreference.last_digest_at, cutoff - period)
+        return db.session.query(cls, NotificationPreference).join(
+            NotificationPreference, NotificationPreference.user_id == cls.user_id
+        ).filter(
+            NotificationPreference.email_frequency == frequency,
+            NotificationPreference.email_enabled.is_(True),
+            cls.created_at > window_start,
+            cls.created_at <= cutoff
+        ).order_by(cls.user_id, cls.created_at, cls.id)
+    
+    @classmethod
+    def reconcile_unread_counts(cls):
+        """
+        Rewrite every cached unread counter from the database to repair drift
+        (e.g. from writes that bypassed the ORM). Returns the number of
+        counters that were corrected.
+        """
+        prefix = cls.unread_count_key('')
+        user_ids = [int(key[len(prefix):]) for key in cache.keys(prefix) if key[len(prefix):].isdigit()]
+        if not user_ids:
+            return 0
+        
+        counts = dict(db.session.query(cls.user_id, func.count(cls.id)).filter(
+            cls.user_id.in_(user_ids),
+            cls.read.is_(False)
+        ).group_by(cls.user_id).all())
+        
+        corrected = 0
+        for user_id in user_ids:
+            key = cls.unread_count_key(user_id)
+            actual = counts.get(user_id, 0)
+            if cache.get(key) != actual:
+                cache.set(key, actual)
+                corrected += 1
+        return corrected
+
+
+def _track_unread_delta(target, delta):
+    """Buffer a counter change until the surrounding transaction commits"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('unread_deltas', Counter())[target.user_id] += delta
+
+@event.listens_for(Notification, 'after_insert')
+def _notification_inserted(mapper, connection, target):
+    if not target.read:
+        _track_unread_delta(target, 1)
+    pubsub.publish_after_commit(object_session(target), user_channel(target.user_id), {
+        'event': 'notification',
+        'id': target.id,
+        'data': target.to_dict()
+    })
+
+@event.listens_for(Notification, 'after_update')
+def _notification_updated(mapper, connection, target):
+    history = inspect(target).attrs.read.history
+    if history.has_changes() and history.deleted:
+        was_read, is_read = bool(history.deleted[0]), bool(target.read)
+        if was_read != is_read:
+            _track_unread_delta(target, -1 if is_read else 1)
+
+@event.listens_for(Notification, 'after_delete')
+def _notification_deleted(mapper, connection, target):
+    if not target.read:
+        _track_unread_delta(target, -1)
+
+@event.listens_for(Session, 'after_commit')
+def _apply_unread_deltas(session):
+    for user_id, delta in session.info.pop('unread_deltas', {}).items():
+        Notification.adjust_unread_count(user_id, delta)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_unread_deltas(session):
+    session.info.pop('unread_deltas', None)
 
 
 class PushSubscription(db.Model):
@@ -1,15 +1,22 @@
 from datetime import datetime
-from extensions.extensions import db
+from sqlalchemy import case, event, func, inspect, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import column_property, joinedload, object_session
+from extensions.extensions import db, cache
+from utils.fieldsets import select_fields
+from utils.search import TextIndex, search_document
 
 class Rating(db.Model):
     __tablename__ = 'ratings'
     
     id = db.Column(db.Integer, primary_key=True)
     reviewer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    provider_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # active_history loads the previous value on change so the update event
+    # below can move the old rating out of ProviderRatingStats
+    provider_id = column_property(db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False), active_history=True)
     service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=False)
     
-    rating = db.Column(db.Integer, nullable=False)  # 1-5 stars
+    rating = column_property(db.Column(db.Integer, nullable=False), active_history=True)  # 1-5 stars
     comment = db.Column(db.Text, nullable=True)
     is_anonymous = db.Column(db.Boolean, default=False)
     
@@ -25,13 +32,31 @@ class Rating(db.Model):
     
     __table_args__ = (
         db.UniqueConstraint('reviewer_id', 'service_id', name='_reviewer_service_uc'),
+        # Keyset pagination of a provider's ratings
+        db.Index('ix_ratings_provider_id_created_at_id', 'provider_id', 'created_at', 'id'),
+        # Incremental analytics exports
+        db.Index('ix_ratings_updated_at_id', 'updated_at', 'id'),
+        # Full-text search on PostgreSQL; SQLite uses the ratings_fts table
+        db.Index('ix_ratings_search', search_document(comment), postgresql_using='gin').ddl_if(dialect='postgresql'),
     )
     
-    def to_dict(self):
-        return {
+    # Keys to_dict() can render, for the fields= query parameter
+    FIELDS = (
+        'id', 'reviewer_id', 'provider_id', 'service_id', 'rating', 'comment',
+        'is_anonymous', 'provider_response', 'responded_at', 'created_at', 'updated_at',
+    )
+    # Relationships to_dict() can embed, and those embedded unless asked otherwise
+    EXPANDABLE = ('reviewer', 'provider')
+    DEFAULT_EXPAND = EXPANDABLE
+    
+    def to_dict(self, fields=None, expand=None):
+        """Serialize the rating; fields and expand as for Service.to_dict()"""
+        if expand is None:
+            expand = self.DEFAULT_EXPAND
+        result = {
             'id': self.id,
-            'reviewer': None if self.is_anonymous else self.reviewer.to_dict(),
-            'provider': self.provider.to_dict(),
+            'reviewer_id': None if self.is_anonymous else self.reviewer_id,
+            'provider_id': self.provider_id,
             'service_id': self.service_id,
             'rating': self.rating,
             'comment': self.comment,
@@ -41,42 +66,37 @@ class Rating(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+        if 'reviewer' in expand:
+            result['reviewer'] = None if self.is_anonymous else self.reviewer.to_dict()
+        if 'provider' in expand:
+            result['provider'] = self.provider.to_dict()
+        return select_fields(result, fields)
+    
+    @classmethod
+    def serialization_options(cls, expand=None):
+        """Loader options joining the relationships in expand (DEFAULT_EXPAND if None)"""
+        if expand is None:
+            expand = cls.DEFAULT_EXPAND
+        return [joinedload(getattr(cls, name)) for name in cls.EXPANDABLE if name in expand]
     
     @classmethod
     def get_average_rating(cls, provider_id):
-        """Calculate average rating for a provider"""
-        from sqlalchemy import func
-        result = db.session.query(
-            func.avg(cls.rating).label('average'),
-            func.count(cls.id).label('count')
-        ).filter_by(provider_id=provider_id).first()
-        
+        """Get average rating and count for a provider from the materialized stats"""
+        stats = ProviderRatingStats.query.get(provider_id)
         return {
-            'average': float(result[0]) if result[0] else 0,
-            'count': result[1]
+            'average': stats.average if stats else 0,
+            'count': stats.rating_count if stats else 0
         }
     
     @classmethod
     def get_ratings_summary(cls, provider_id):
-        """Get rating distribution (count of each star rating)"""
-        from sqlalchemy import func
-        
-        # Get count for each rating value (1-5)
-        distribution = dict(db.session.query(
-            cls.rating,
-            func.count(cls.id)
-        ).filter_by(provider_id=provider_id).group_by(cls.rating).all())
-        
-        # Ensure all ratings 1-5 are in the result with 0 if no ratings
-        rating_summary = {str(i): distribution.get(i, 0) for i in range(1, 6)}
-        
-        # Add average and total count
-        avg_rating = cls.get_average_rating(provider_id)
+        """Get rating distribution (count of each star rating) with average and total"""
+        stats = ProviderRatingStats.query.get(provider_id)
+        rating_summary = stats.distribution if stats else {str(i): 0 for i in range(1, 6)}
         rating_summary.update({
-            'average': avg_rating['average'],
-            'total': avg_rating['count']
+            'average': stats.average if stats else 0,
+            'total': stats.rating_count if stats else 0
         })
-        
         return rating_summary
     
     def add_provider_response(self, response_text):
@@ -84,3 +104,148 @@ class Rating(db.Model):
         self.provider_response = response_text
         self.responded_at = datetime.utcnow()
         return self
+
+
+# Full-text search over review comments
+Rating.search_index = TextIndex(Rating.__table__, ('comment',), snippet_columns=('comment',))
+
+
+class ProviderRatingStats(db.Model):
+    """Per-provider rating aggregates, kept current by the Rating write events below"""
+    __tablename__ = 'provider_rating_stats'
+    
+    provider_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    rating_count = db.Column(db.Integer, nullable=False, default=0)
+    rating_sum = db.Column(db.Integer, nullable=False, default=0)
+    count_1 = db.Column(db.Integer, nullable=False, default=0)
+    count_2 = db.Column(db.Integer, nullable=False, default=0)
+    count_3 = db.Column(db.Integer, nullable=False, default=0)
+    count_4 = db.Column(db.Integer, nullable=False, default=0)
+    count_5 = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    provider = db.relationship('User', backref=db.backref('rating_stats', uselist=False))
+    
+    @property
+    def average(self):
+        return round(self.rating_sum / self.rating_count, 2) if self.rating_count else 0
+    
+    @property
+    def distribution(self):
+        return {str(i): getattr(self, f'count_{i}') for i in range(1, 6)}
+    
+    def to_dict(self):
+        return {
+            'provider_id': self.provider_id,
+            'average_rating': self.average,
+            'total_ratings': self.rating_count,
+            'rating_distribution': self.distribution,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    @classmethod
+    def apply_delta(cls, connection, provider_id, rating, delta):
+        """Add (delta=1) or remove (delta=-1) a single star rating for a provider"""
+        if provider_id is None or rating is None:
+            return
+        table = cls.__table__
+        bucket = f'count_{rating}'
+        now = datetime.utcnow()
+        if delta < 0:
+            # The provider's row exists since the rating being removed was counted
+            connection.execute(
+                table.update()
+                .where(table.c.provider_id == provider_id)
+                .values({
+                    'rating_count': table.c.rating_count + delta,
+                    'rating_sum': table.c.rating_sum + delta * rating,
+                    bucket: table.c[bucket] + delta,
+                    'updated_at': now
+                })
+            )
+            return
+        
+        # A single upsert, so two first ratings of a provider committed at
+        # once both count instead of one failing on the primary key
+        insert = (postgresql if connection.dialect.name == 'postgresql' else sqlite).insert
+        statement = insert(table).values({
+            'provider_id': provider_id,
+            'rating_count': delta,
+            'rating_sum': delta * rating,
+            bucket: delta,
+            'updated_at': now
+        })
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['provider_id'],
+            set_={
+                'rating_count': table.c.rating_count + statement.excluded.rating_count,
+                'rating_sum': table.c.rating_sum + statement.excluded.rating_sum,
+                bucket: table.c[bucket] + statement.excluded[bucket],
+                'updated_at': statement.excluded.updated_at
+            }
+        ))
+    
+    @classmethod
+    def rebuild(cls, provider_id=None):
+        """
+        Recompute the stats from the ratings table with a single GROUP BY.
+        
+        Rebuilds every provider unless provider_id is given. Returns the
+        number of providers written.
+        """
+        table = cls.__table__
+        aggregates = select(
+            Rating.provider_id,
+            func.count(Rating.id),
+            func.coalesce(func.sum(Rating.rating), 0),
+            *[func.sum(case((Rating.rating == i, 1), else_=0)) for i in range(1, 6)],
+            # The application clock, as apply_delta() uses
+            literal(datetime.utcnow(), db.DateTime)
+        ).group_by(Rating.provider_id)
+        
+        delete = table.delete()
+        if provider_id is not None:
+            aggregates = aggregates.where(Rating.provider_id == provider_id)
+            delete = delete.where(table.c.provider_id == provider_id)
+        
+        db.session.execute(delete)
+        result = db.session.execute(table.insert().from_select([
+            'provider_id', 'rating_count', 'rating_sum',
+            'count_1', 'count_2', 'count_3', 'count_4', 'count_5', 'updated_at'
+        ], aggregates))
+        db.session.commit()
+        cache.bump_tags(['ratings'])
+        return result.rowcount
+
+
+def _invalidate_cached_ratings(target):
+    # Drops cached rating responses, including provider summaries
+    session = object_session(target)
+    if session is not None:
+        cache.bump_tags_after_commit(session, 'ratings')
+
+@event.listens_for(Rating, 'after_insert')
+def _rating_inserted(mapper, connection, target):
+    ProviderRatingStats.apply_delta(connection, target.provider_id, target.rating, 1)
+    Rating.search_index.row_inserted(connection, target)
+    _invalidate_cached_ratings(target)
+
+@event.listens_for(Rating, 'after_delete')
+def _rating_deleted(mapper, connection, target):
+    ProviderRatingStats.apply_delta(connection, target.provider_id, target.rating, -1)
+    Rating.search_index.row_deleted(connection, target)
+    _invalidate_cached_ratings(target)
+
+@event.listens_for(Rating, 'after_update')
+def _rating_updated(mapper, connection, target):
+    _invalidate_cached_ratings(target)
+    Rating.search_index.row_updated(connection, target)
+    state = inspect(target)
+    rating_history = state.attrs.rating.history
+    provider_history = state.attrs.provider_id.history
+    if not rating_history.has_changes() and not provider_history.has_changes():
+        return
+    old_rating = rating_history.deleted[0] if rating_history.deleted else target.rating
+    old_provider = provider_history.deleted[0] if provider_history.deleted else target.provider_id
+    ProviderRatingStats.apply_delta(connection, old_provider, old_rating, -1)
+    ProviderRatingStats.apply_delta(connection, target.provider_id, target.rating, 1)
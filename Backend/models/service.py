@@ -1,6 +1,13 @@
 from datetime import datetime
 from enum import Enum
-from extensions.extensions import db
+from flask import current_app
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import joinedload, object_session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from extensions.extensions import db, cache, pubsub
+from utils.fieldsets import select_fields
+from utils.pubsub import user_channel
+from utils.search import TextIndex, search_document
 
 class ServiceStatus(Enum):
     PENDING = 'pending'      # Service posted, waiting for provider
@@ -41,7 +48,51 @@ class Service(db.Model):
     offers = db.relationship('ServiceOffer', backref='service', lazy=True, cascade='all, delete-orphan')
     messages = db.relationship('ServiceMessage', backref='service', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self, include_details=False):
+    __table_args__ = (
+        # Bounding-box prefilter for radius searches
+        db.Index('ix_services_latitude_longitude', 'latitude', 'longitude'),
+        # Keyset pagination on (created_at, id)
+        db.Index('ix_services_created_at_id', 'created_at', 'id'),
+        # A client's own services, newest first
+        db.Index('ix_services_client_id_created_at_id', 'client_id', 'created_at', 'id'),
+        # A provider's assigned services, optionally by status
+        db.Index('ix_services_provider_id_status', 'provider_id', 'status'),
+        db.Index('ix_services_category_id_status', 'category_id', 'status'),
+        # Incremental analytics exports
+        db.Index('ix_services_updated_at_id', 'updated_at', 'id'),
+        # The open-jobs feed every provider polls; partial so it only holds pending rows
+        db.Index('ix_services_pending_created_at_id', 'created_at', 'id',
+                 postgresql_where=db.text("status = 'PENDING'"),
+                 sqlite_where=db.text("status = 'PENDING'")),
+        # Overdue pending services for the expiry job
+        db.Index('ix_services_pending_deadline_id', 'deadline', 'id',
+                 postgresql_where=db.text("status = 'PENDING'"),
+                 sqlite_where=db.text("status = 'PENDING'")),
+        # Full-text search on PostgreSQL; SQLite uses the services_fts table
+        db.Index('ix_services_search', search_document(title, description),
+                 postgresql_using='gin').ddl_if(dialect='postgresql'),
+    )
+    
+    # Keys to_dict() can render, for the fields= query parameter
+    FIELDS = (
+        'id', 'title', 'description', 'status', 'budget', 'deadline', 'location',
+        'coordinates', 'client_id', 'provider_id', 'category_id', 'created_at',
+        'updated_at', 'assigned_at', 'started_at', 'completed_at',
+    )
+    # Relationships to_dict() can embed, and those embedded unless asked otherwise
+    EXPANDABLE = ('client', 'provider', 'category')
+    DEFAULT_EXPAND = EXPANDABLE
+    
+    def to_dict(self, include_details=False, fields=None, expand=None):
+        """
+        Serialize the service.
+        
+        expand names the relationships to embed (DEFAULT_EXPAND if None);
+        the others are neither touched nor rendered. fields restricts the
+        output to those keys, see utils.fieldsets.parse_fieldset().
+        """
+        if expand is None:
+            expand = self.DEFAULT_EXPAND
         result = {
             'id': self.id,
             'title': self.title,
@@ -54,76 +105,189 @@ class Service(db.Model):
                 'latitude': self.latitude,
                 'longitude': self.longitude
             } if self.latitude and self.longitude else None,
-            'client': self.client.to_dict() if self.client else None,
-            'provider': self.provider.to_dict() if self.provider else None,
-            'category': self.category.to_dict() if self.category else None,
+            'client_id': self.client_id,
+            'provider_id': self.provider_id,
+            'category_id': self.category_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
+        if 'client' in expand:
+            result['client'] = self.client.to_dict() if self.client else None
+        if 'provider' in expand:
+            result['provider'] = self.provider.to_dict() if self.provider else None
+        if 'category' in expand:
+            result['category'] = self.category.to_dict() if self.category else None
         
         if include_details:
             result.update({
                 'images': [img.to_dict() for img in self.images],
                 'offers': [offer.to_dict() for offer in self.offers],
                 'messages': [msg.to_dict() for msg in self.messages],
+            })
+        if include_details or fields is not None:
+            result.update({
                 'assigned_at': self.assigned_at.isoformat() if self.assigned_at else None,
                 'started_at': self.started_at.isoformat() if self.started_at else None,
                 'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             })
         
-        return result
+        return select_fields(result, fields)
+    
+    @classmethod
+    def serialization_options(cls, include_details=False, expand=None):
+        """Loader options for every relationship touched by to_dict()
+        
+        Many-to-one relationships are joined into the main query, collections
+        are fetched with one extra SELECT ... IN per relationship, so the
+        number of queries stays constant regardless of page size. Only the
+        relationships in expand (DEFAULT_EXPAND if None) are loaded.
+        """
+        from models.category import ServiceCategory
+        
+        if expand is None:
+            expand = cls.DEFAULT_EXPAND
+        loaders = {
+            'client': joinedload(cls.client),
+            'provider': joinedload(cls.provider),
+            'category': joinedload(cls.category).selectinload(ServiceCategory.subcategories),
+        }
+        options = [loaders[name] for name in cls.EXPANDABLE if name in expand]
+        
+        if include_details:
+            options.extend([
+                selectinload(cls.images),
+                selectinload(cls.offers).joinedload(ServiceOffer.provider),
+                selectinload(cls.messages).joinedload(ServiceMessage.sender),
+            ])
+        return options
+    
+    def _compare_and_set(self, expected, error, **values):
+        """
+        Apply values to this service with one conditional UPDATE that only
+        matches while its status is still one of expected, so concurrent
+        transitions cannot both succeed and no row lock is held beforehand.
+        Raises ValueError(error) when the row had already moved on; the
+        caller commits.
+        """
+        values.setdefault('updated_at', datetime.utcnow())
+        result = db.session.execute(
+            update(Service).where(
+                Service.id == self.id,
+                Service.status.in_(expected)
+            ).values(**values).execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            raise ValueError(error)
+        for key, value in values.items():
+            set_committed_value(self, key, value)
     
     def assign_provider(self, provider_id):
         """Assign a provider to this service"""
+        error = "Only pending services can be assigned"
         if self.status != ServiceStatus.PENDING:
-            raise ValueError("Only pending services can be assigned")
-            
-        self.provider_id = provider_id
-        self.status = ServiceStatus.ASSIGNED
-        self.assigned_at = datetime.utcnow()
+            raise ValueError(error)
+        self._compare_and_set([ServiceStatus.PENDING], error, provider_id=provider_id,
+                              status=ServiceStatus.ASSIGNED, assigned_at=datetime.utcnow())
     
     def start_service(self):
         """Mark service as in progress"""
+        error = "Only assigned services can be started"
         if self.status != ServiceStatus.ASSIGNED:
-            raise ValueError("Only assigned services can be started")
-            
-        self.status = ServiceStatus.IN_PROGRESS
-        self.started_at = datetime.utcnow()
+            raise ValueError(error)
+        self._compare_and_set([ServiceStatus.ASSIGNED], error,
+                              status=ServiceStatus.IN_PROGRESS, started_at=datetime.utcnow())
     
     def complete_service(self):
         """Mark service as completed"""
+        error = "Only in-progress services can be completed"
         if self.status != ServiceStatus.IN_PROGRESS:
-            raise ValueError("Only in-progress services can be completed")
-            
-        self.status = ServiceStatus.COMPLETED
-        self.completed_at = datetime.utcnow()
+            raise ValueError(error)
+        self._compare_and_set([ServiceStatus.IN_PROGRESS], error,
+                              status=ServiceStatus.COMPLETED, completed_at=datetime.utcnow())
     
     def cancel_service(self, reason=None):
         """Cancel the service"""
-        if self.status in [ServiceStatus.COMPLETED, ServiceStatus.CANCELLED, ServiceStatus.REJECTED, ServiceStatus.EXPIRED]:
+        open_statuses = [ServiceStatus.PENDING, ServiceStatus.ASSIGNED, ServiceStatus.IN_PROGRESS]
+        if self.status not in open_statuses:
             raise ValueError(f"Cannot cancel service in {self.status} state")
-            
-        self.status = ServiceStatus.CANCELLED
-        self.updated_at = datetime.utcnow()
+        self._compare_and_set(open_statuses, "Service is no longer open and cannot be cancelled",
+                              status=ServiceStatus.CANCELLED)
     
     def reject_service(self, reason=None):
         """Reject the service (by provider)"""
+        error = "Only assigned services can be rejected"
         if self.status != ServiceStatus.ASSIGNED:
-            raise ValueError("Only assigned services can be rejected")
-            
-        self.status = ServiceStatus.REJECTED
+            raise ValueError(error)
         prev_provider = self.provider_id
-        self.provider_id = None
-        self.updated_at = datetime.utcnow()
+        self._compare_and_set([ServiceStatus.ASSIGNED], error, status=ServiceStatus.REJECTED, provider_id=None)
         return prev_provider  # Return the previous provider ID for notifications
     
     def expire_service(self):
         """Mark service as expired"""
+        error = "Only pending services can be expired"
         if self.status != ServiceStatus.PENDING:
-            raise ValueError("Only pending services can be expired")
-            
-        self.status = ServiceStatus.EXPIRED
-        self.updated_at = datetime.utcnow()
+            raise ValueError(error)
+        self._compare_and_set([ServiceStatus.PENDING], error, status=ServiceStatus.EXPIRED)
+    
+    def change_status(self, status):
+        """
+        Set any status (the status endpoints allow every transition), as long
+        as nobody else changed it since this service was loaded
+        """
+        now = datetime.utcnow()
+        values = {'status': status}
+        if status == ServiceStatus.IN_PROGRESS:
+            values['started_at'] = now
+        elif status == ServiceStatus.COMPLETED:
+            values['completed_at'] = now
+        self._compare_and_set([self.status], "Service status was changed by someone else; reload and retry",
+                              updated_at=now, **values)
+    
+    @classmethod
+    def expire_overdue(cls, now=None, batch_size=500):
+        """
+        Expire up to batch_size pending services whose deadline has passed,
+        oldest deadline first, with a single UPDATE; their pending offers are
+        rejected. Returns (id, client_id, title) of each expired service; the
+        caller commits.
+        """
+        now = now or datetime.utcnow()
+        overdue = select(cls.id).where(
+            cls.status == ServiceStatus.PENDING,
+            cls.deadline < now
+        ).order_by(cls.deadline, cls.id).limit(batch_size)
+        
+        def expire(ids):
+            # Re-checking the status keeps a service assigned meanwhile untouched
+            return update(cls).where(
+                cls.id.in_(ids),
+                cls.status == ServiceStatus.PENDING
+            ).values(status=ServiceStatus.EXPIRED, updated_at=now).execution_options(synchronize_session=False)
+        
+        if db.session.get_bind().dialect.update_returning:
+            statement = expire(overdue.scalar_subquery()).returning(cls.id, cls.client_id, cls.title)
+            expired = db.session.execute(statement).all()
+        else:
+            expired = db.session.execute(
+                select(cls.id, cls.client_id, cls.title).where(cls.id.in_(overdue.scalar_subquery()))
+            ).all()
+            if expired:
+                db.session.execute(expire([row.id for row in expired]))
+        
+        service_ids = [row.id for row in expired]
+        if service_ids:
+            ServiceOffer.query.filter(
+                ServiceOffer.service_id.in_(service_ids),
+                ServiceOffer.status == ServiceOffer.PENDING
+            ).update({ServiceOffer.status: ServiceOffer.REJECTED, ServiceOffer.updated_at: now},
+                     synchronize_session=False)
+            cache.bump_tags_after_commit(db.session, *(ServiceOffer.summary_tag(sid) for sid in service_ids))
+        return expired
+
+
+# Full-text search over titles and descriptions, titles counting most
+Service.search_index = TextIndex(Service.__table__, ('title', 'description'),
+                                 weights=(10.0, 1.0), snippet_columns=('description',))
 
 
 class ServiceImage(db.Model):
@@ -149,17 +313,31 @@ class ServiceImage(db.Model):
 class ServiceOffer(db.Model):
     __tablename__ = 'service_offers'
     
+    PENDING = 'pending'
+    ACCEPTED = 'accepted'
+    REJECTED = 'rejected'
+    WITHDRAWN = 'withdrawn'
+    
     id = db.Column(db.Integer, primary_key=True)
     service_id = db.Column(db.Integer, db.ForeignKey('services.id'), nullable=False)
     provider_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
     message = db.Column(db.Text, nullable=True)
-    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, accepted, rejected
+    status = db.Column(db.String(20), default=PENDING, nullable=False)  # pending, accepted, rejected, withdrawn
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     provider = db.relationship('User', backref='offers')
     
+    __table_args__ = (
+        # Best (lowest) offers of a service, and the summary's count/min/median
+        db.Index('ix_service_offers_service_id_status_amount_id', 'service_id', 'status', 'amount', 'id'),
+        # One live offer per provider and service
+        db.Index('ix_service_offers_pending_provider', 'service_id', 'provider_id', unique=True,
+                 postgresql_where=db.text("status = 'pending'"),
+                 sqlite_where=db.text("status = 'pending'")),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -171,6 +349,92 @@ class ServiceOffer(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
+    
+    @classmethod
+    def best(cls, service_id, limit=10, status=PENDING, provider_id=None):
+        """The lowest offers of a service, read in index order with their providers"""
+        query = cls.query.options(joinedload(cls.provider)).filter(
+            cls.service_id == service_id,
+            cls.status == status
+        )
+        if provider_id is not None:
+            query = query.filter(cls.provider_id == provider_id)
+        return query.order_by(cls.amount.asc(), cls.id.asc()).limit(limit).all()
+    
+    @staticmethod
+    def summary_tag(service_id):
+        return f'offers:{service_id}'
+    
+    @classmethod
+    def compute_summary(cls, service_id):
+        """Count, lowest and median amount of the pending offers, from the index"""
+        pending = db.session.query(cls.amount).filter(
+            cls.service_id == service_id,
+            cls.status == cls.PENDING
+        )
+        count, lowest = pending.with_entities(func.count(cls.id), func.min(cls.amount)).one()
+        median = None
+        if count:
+            # The middle one or two amounts, skipping to them along the index
+            middle = pending.order_by(cls.amount.asc()).offset((count - 1) // 2).limit(2 - count % 2).all()
+            median = sum(amount for amount, in middle) / len(middle)
+        return {
+            'count': count,
+            'lowest': float(lowest) if lowest is not None else None,
+            'median': float(median) if median is not None else None
+        }
+    
+    @classmethod
+    def get_summary(cls, service_id):
+        """Pending-offer summary from the cache, computed on a miss"""
+        version, = cache.tag_versions([cls.summary_tag(service_id)])
+        key = f'offers:summary:{service_id}:{version}'
+        summary = cache.get(key)
+        cache.record('offer_summary', summary is not None)
+        if summary is None:
+            summary = cls.compute_summary(service_id)
+            cache.set(key, summary, timeout=current_app.config.get('OFFER_SUMMARY_CACHE_TIMEOUT', 300))
+        return summary
+    
+    def accept(self):
+        """
+        Accept this offer: assign its provider to the service and reject every
+        competing pending offer with a single UPDATE. Returns the provider ids
+        of the rejected offers; the caller commits.
+        """
+        if self.status != self.PENDING:
+            raise ValueError("Only pending offers can be accepted")
+        self.service.assign_provider(self.provider_id)
+        self.status = self.ACCEPTED
+        
+        # Only offers this UPDATE actually rejects are reported, so one placed
+        # between a read and the write can neither be missed nor notified twice
+        statement = update(ServiceOffer).where(
+            ServiceOffer.service_id == self.service_id,
+            ServiceOffer.id != self.id,
+            ServiceOffer.status == self.PENDING
+        ).values(status=self.REJECTED, updated_at=datetime.utcnow()).execution_options(
+            synchronize_session='evaluate'
+        )
+        if db.session.get_bind().dialect.update_returning:
+            rejected = db.session.execute(statement.returning(ServiceOffer.provider_id)).scalars().all()
+        else:
+            competing = db.session.query(ServiceOffer.id, ServiceOffer.provider_id).filter(
+                ServiceOffer.service_id == self.service_id,
+                ServiceOffer.id != self.id,
+                ServiceOffer.status == self.PENDING
+            ).all()
+            rejected = [offer.provider_id for offer in competing]
+            if competing:
+                db.session.execute(statement.where(ServiceOffer.id.in_([offer.id for offer in competing])))
+        cache.bump_tags_after_commit(db.session, self.summary_tag(self.service_id))
+        return rejected
+    
+    def withdraw(self):
+        """Withdraw this offer (by its provider)"""
+        if self.status != self.PENDING:
+            raise ValueError("Only pending offers can be withdrawn")
+        self.status = self.WITHDRAWN
 
 
 class ServiceMessage(db.Model):
@@ -182,9 +446,19 @@ class ServiceMessage(db.Model):
     message = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Moves when a message is marked read; the export watermark
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     sender = db.relationship('User', backref='messages_sent')
     
+    __table_args__ = (
+        # A conversation in id order; ids grow with created_at, so this also
+        # serves chronological reads
+        db.Index('ix_service_messages_service_id_id', 'service_id', 'id'),
+        # Incremental analytics exports
+        db.Index('ix_service_messages_updated_at_id', 'updated_at', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -194,3 +468,96 @@ class ServiceMessage(db.Model):
             'is_read': self.is_read,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
+    
+    @classmethod
+    def window(cls, service_id, after_id=None, before_id=None, limit=50):
+        """
+        Up to limit messages of a conversation, oldest first, plus whether more exist.
+        
+        after_id returns the messages following it (polling for new ones),
+        before_id the ones preceding it (scrolling back), neither the latest.
+        Each is a range scan on the (service_id, id) index; senders are joined in.
+        """
+        query = cls.query.options(joinedload(cls.sender)).filter(cls.service_id == service_id)
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+        if before_id is not None:
+            query = query.filter(cls.id < before_id)
+        
+        # Read forward from after_id, otherwise backward from the newest end
+        forward = after_id is not None
+        messages = query.order_by(cls.id.asc() if forward else cls.id.desc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        if not forward:
+            messages.reverse()
+        return messages, has_more
+    
+    @classmethod
+    def mark_read(cls, service_id, reader_id, first_id, last_id):
+        """Mark the other party's unread messages in [first_id, last_id] as read with one UPDATE"""
+        return cls.query.filter(
+            cls.service_id == service_id,
+            cls.id >= first_id,
+            cls.id <= last_id,
+            cls.sender_id != reader_id,
+            cls.is_read.is_(False)
+        ).update({cls.is_read: True, cls.updated_at: datetime.utcnow()}, synchronize_session='evaluate')
+
+
+@event.listens_for(Service, 'after_insert')
+def _service_inserted(mapper, connection, target):
+    Service.search_index.row_inserted(connection, target)
+
+@event.listens_for(Service, 'after_update')
+def _service_updated(mapper, connection, target):
+    Service.search_index.row_updated(connection, target)
+
+@event.listens_for(Service, 'after_delete')
+def _service_deleted(mapper, connection, target):
+    Service.search_index.row_deleted(connection, target)
+
+@event.listens_for(ServiceMessage, 'after_insert')
+def _message_inserted(mapper, connection, target):
+    """Push new messages to both parties of the service once committed"""
+    services = Service.__table__
+    participants = connection.execute(
+        select(services.c.client_id, services.c.provider_id).where(services.c.id == target.service_id)
+    ).first()
+    if participants is None:
+        return
+    
+    message = {
+        'event': 'message',
+        'id': target.id,
+        'data': {
+            'id': target.id,
+            'service_id': target.service_id,
+            'sender_id': target.sender_id,
+            'message': target.message,
+            'is_read': target.is_read,
+            'created_at': target.created_at.isoformat() if target.created_at else None
+        }
+    }
+    session = object_session(target)
+    for user_id in {participants.client_id, participants.provider_id} - {None}:
+        pubsub.publish_after_commit(session, user_channel(user_id), message)
+
+
+def _invalidate_offer_summary(target):
+    # Drops the cached count/lowest/median of the offer's service
+    session = object_session(target)
+    if session is not None:
+        cache.bump_tags_after_commit(session, ServiceOffer.summary_tag(target.service_id))
+
+@event.listens_for(ServiceOffer, 'after_insert')
+def _offer_inserted(mapper, connection, target):
+    _invalidate_offer_summary(target)
+
+@event.listens_for(ServiceOffer, 'after_update')
+def _offer_updated(mapper, connection, target):
+    _invalidate_offer_summary(target)
+
+@event.listens_for(ServiceOffer, 'after_delete')
+def _offer_deleted(mapper, connection, target):
+    _invalidate_offer_summary(target)
@@ -1,6 +1,8 @@
 from datetime import datetime
+from sqlalchemy import event, func, inspect, or_
+from sqlalchemy.orm import object_session
 from werkzeug.security import generate_password_hash, check_password_hash
-from extensions.extensions import db
+from extensions.extensions import db, cache
 from enum import Enum
 
 class UserRole(Enum):
@@ -29,6 +31,23 @@ class User(db.Model):
     ratings_given = db.relationship('Rating', backref='reviewer', lazy=True, foreign_keys='Rating.reviewer_id')
     ratings_received = db.relationship('Rating', backref='provider', lazy=True, foreign_keys='Rating.provider_id')
     
+    __table_args__ = (
+        # Admin listing: role/is_active filters and the (created_at, id) keyset order
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+        db.Index('ix_users_role_is_active_created_at_id', 'role', 'is_active', 'created_at', 'id'),
+        # Incremental refreshes of the provider matching grid
+        db.Index('ix_users_updated_at', 'updated_at'),
+        # Case-insensitive prefix search; text_pattern_ops lets PostgreSQL
+        # answer LIKE 'abc%' from the index whatever the database collation
+        db.Index('ix_users_email_lower', func.lower(email).label('email_lower'),
+                 postgresql_ops={'email_lower': 'text_pattern_ops'}),
+        db.Index('ix_users_first_name_lower', func.lower(first_name).label('first_name_lower'),
+                 postgresql_ops={'first_name_lower': 'text_pattern_ops'}),
+        db.Index('ix_users_last_name_lower', func.lower(last_name).label('last_name_lower'),
+                 postgresql_ops={'last_name_lower': 'text_pattern_ops'}),
+        db.Index('ix_users_phone_pattern', 'phone', postgresql_ops={'phone': 'text_pattern_ops'}),
+    )
+    
     @property
     def password(self):
         raise AttributeError('password is not a readable attribute')
@@ -49,6 +68,47 @@ class User(db.Model):
     def is_admin(self):
         return self.role == UserRole.ADMIN
     
+    # Rating aggregates, read from the materialized provider_rating_stats row
+    @property
+    def average_rating(self):
+        return self.rating_stats.average if self.rating_stats else 0
+    
+    @property
+    def rating_count(self):
+        return self.rating_stats.rating_count if self.rating_stats else 0
+    
+    @property
+    def rating_distribution(self):
+        return self.rating_stats.distribution if self.rating_stats else {str(i): 0 for i in range(1, 6)}
+    
+    @classmethod
+    def search(cls, role=None, is_active=None, prefix=None):
+        """
+        Users filtered by role and active flag, and optionally by a prefix of
+        their email, first name, last name or phone (case-insensitive).
+        """
+        query = cls.query
+        if role is not None:
+            query = query.filter(cls.role == role)
+        if is_active is not None:
+            query = query.filter(cls.is_active == is_active)
+        if prefix:
+            escaped = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            pattern = escaped.lower() + '%'
+            query = query.filter(or_(
+                func.lower(cls.email).like(pattern, escape='\\'),
+                func.lower(cls.first_name).like(pattern, escape='\\'),
+                func.lower(cls.last_name).like(pattern, escape='\\'),
+                cls.phone.like(escaped + '%', escape='\\'),
+            ))
+        return query
+    
+    # Column order of CSV exports
+    EXPORT_COLUMNS = (
+        'id', 'email', 'first_name', 'last_name', 'phone', 'role', 'is_active',
+        'created_at', 'updated_at',
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -91,6 +151,11 @@ class UserProfile(db.Model):
     
     user = db.relationship('User', backref=db.backref('profile', uselist=False))
     
+    __table_args__ = (
+        # Incremental refreshes of the provider matching grid
+        db.Index('ix_user_profiles_updated_at', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -114,3 +179,16 @@ class UserProfile(db.Model):
                 'longitude': self.longitude
             } if self.latitude and self.longitude else None
         }
+
+
+# User columns rendered by to_dict() inside cached responses that embed users
+CACHED_USER_COLUMNS = ('email', 'first_name', 'last_name', 'phone', 'role', 'is_active')
+
+@event.listens_for(User, 'after_update')
+def _user_updated(mapper, connection, target):
+    # Cached rating responses embed the reviewer and the provider
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in CACHED_USER_COLUMNS):
+        session = object_session(target)
+        if session is not None:
+            cache.bump_tags_after_commit(session, 'ratings')
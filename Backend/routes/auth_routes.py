@@ -3,25 +3,29 @@ from flask_jwt_extended import (
     create_access_token, create_refresh_token, jwt_required,
     get_jwt_identity, get_jwt
 )
+from marshmallow import EXCLUDE, ValidationError
 from werkzeug.security import generate_password_hash
 from datetime import timedelta
 
 from models.user import User, UserRole
 from schemas.auth_schema import (
     RegisterSchema, LoginSchema, RefreshTokenSchema,
-    ForgotPasswordSchema, ResetPasswordSchema, ChangePasswordSchema, UserUpdateSchema
+    ForgotPasswordSchema, ResetPasswordSchema, ChangePasswordSchema, UserUpdateSchema,
+    UserFilterSchema
 )
 from services.auth_service import AuthService
-from extensions.extensions import db, limiter
+from extensions.extensions import db, limiter, cache
 from utils.decorators import validate_schema, role_required
 from utils.email import send_password_reset_email
+from utils.pagination import keyset_paginate
+from utils.streaming import stream_query
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 @auth_bp.route('/register', methods=['POST'])
 @limiter.limit("10 per minute")
 @validate_schema(RegisterSchema())
-def register():
+def register(data):
     """
     Register a new user account
     ---
@@ -53,7 +57,6 @@ def register():
         schema:
           $ref: '#/definitions/Error'
     """
-    data = request.get_json()
     
     # Check if email already exists
     if User.query.filter_by(email=data['email']).first():
@@ -90,7 +93,7 @@ def register():
 @auth_bp.route('/login', methods=['POST'])
 @limiter.limit("10 per minute")
 @validate_schema(LoginSchema())
-def login():
+def login(data):
     """
     User login
     ---
@@ -134,7 +137,6 @@ def login():
         schema:
           $ref: '#/definitions/Error'
     """
-    data = request.get_json()
     user = User.query.filter_by(email=data['email']).first()
     
     if not user or not user.check_password(data['password']):
@@ -185,7 +187,7 @@ def refresh():
 @auth_bp.route('/forgot-password', methods=['POST'])
 @limiter.limit("5 per hour")
 @validate_schema(ForgotPasswordSchema())
-def forgot_password():
+def forgot_password(data):
     """
     Request password reset
     ---
@@ -215,7 +217,6 @@ def forgot_password():
               type: string
               example: "If your email is registered, you will receive a password reset link"
     """
-    data = request.get_json()
     user = User.query.filter_by(email=data['email']).first()
     
     if user:
@@ -227,7 +228,7 @@ def forgot_password():
 
 @auth_bp.route('/reset-password', methods=['POST'])
 @validate_schema(ResetPasswordSchema())
-def reset_password():
+def reset_password(data):
     """
     Reset password
     ---
@@ -270,7 +271,6 @@ def reset_password():
         schema:
           $ref: '#/definitions/Error'
     """
-    data = request.get_json()
     user_id = AuthService.verify_reset_token(data['token'])
     
     if not user_id:
@@ -288,7 +288,7 @@ def reset_password():
 @auth_bp.route('/change-password', methods=['POST'])
 @jwt_required()
 @validate_schema(ChangePasswordSchema())
-def change_password():
+def change_password(data):
     """
     Change password
     ---
@@ -335,7 +335,6 @@ def change_password():
           $ref: '#/definitions/Error'
     """
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     user = User.query.get(current_user_id)
     if not user.check_password(data['current_password']):
@@ -370,7 +369,7 @@ def get_profile():
 @auth_bp.route('/profile', methods=['PUT'])
 @jwt_required()
 @validate_schema(UserUpdateSchema())
-def update_profile():
+def update_profile(data):
     """
     Update current user profile
     ---
@@ -418,7 +417,6 @@ def update_profile():
     """
     current_user_id = get_jwt_identity()
     user = User.query.get_or_404(current_user_id)
-    data = request.get_json()
     
     # Update user fields
     for field in ['first_name', 'last_name', 'phone', 'address', 
@@ -434,13 +432,56 @@ def update_profile():
 @role_required(UserRole.ADMIN)
 def list_users():
     """
-    List all users (admin only)
+    List users (admin only)
     ---
     tags:
       - Authentication
     security:
       - Bearer: []
-    description: Get a list of all users (only accessible by admins)
+    description: |
+      Page through users (only accessible by admins), optionally filtered by role,
+      active flag and a prefix of their email, name or phone. With format=ndjson
+      or format=csv every match is streamed instead, in constant memory.
+    parameters:
+      - name: role
+        in: query
+        type: string
+        enum: [client, provider, admin]
+      - name: is_active
+        in: query
+        type: boolean
+      - name: q
+        in: query
+        type: string
+        description: Case-insensitive prefix of email, first name, last name or phone
+      - name: page
+        in: query
+        type: integer
+        default: 1
+      - name: per_page
+        in: query
+        type: integer
+        default: 20
+        description: Page size (1-100)
+      - name: cursor
+        in: query
+        type: string
+        description: |
+          Opt into keyset pagination. Pass an empty value for the first page and
+          the returned next_cursor for the following ones. Ordering is newest first.
+      - name: include_total
+        in: query
+        type: boolean
+        description: In cursor mode, also return the total count (costs a COUNT query)
+      - name: format
+        in: query
+        type: string
+        enum: [json, ndjson, csv]
+        default: json
+        description: |
+          ndjson and csv stream all matching users, ignoring pagination. CSV
+          cells starting with =, +, -, @, tab or carriage return are prefixed
+          with ' so spreadsheets do not run them as formulas.
     responses:
       200:
         description: List of users
@@ -451,9 +492,69 @@ def list_users():
               type: array
               items:
                 $ref: '#/definitions/User'
+            total:
+              type: integer
+            pages:
+              type: integer
+            page:
+              type: integer
+            per_page:
+              type: integer
+            next_cursor:
+              type: string
+              description: Cursor for the next page (cursor mode only, null on the last page)
+      400:
+        description: Invalid filters
+        schema:
+          $ref: '#/definitions/Error'
     """
-    users = User.query.all()
-    return {'users': [user.to_dict() for user in users]}
+    try:
+        filters = UserFilterSchema().load(request.args, unknown=EXCLUDE)
+    except ValidationError as err:
+        return {'message': 'Validation error', 'errors': err.messages}, 400
+    per_page = filters['per_page']
+    
+    query = User.search(
+        role=UserRole(filters['role']) if 'role' in filters else None,
+        is_active=filters.get('is_active'),
+        prefix=filters.get('q')
+    )
+    
+    if filters['format'] != 'json':
+        return stream_query(
+            query.order_by(User.id), filters['format'], User.to_dict, User.EXPORT_COLUMNS,
+            filename='users'
+        )
+    
+    # Keyset pagination
+    if 'cursor' in filters:
+        try:
+            result = keyset_paginate(
+                query, User, cursor=filters['cursor'], per_page=per_page,
+                include_total=filters['include_total']
+            )
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        
+        response = {
+            'users': [user.to_dict() for user in result.items],
+            'next_cursor': result.next_cursor,
+            'per_page': per_page
+        }
+        if result.total is not None:
+            response['total'] = result.total
+        return response
+    
+    pagination = query.order_by(User.created_at.desc(), User.id.desc()).paginate(
+        page=filters['page'], per_page=per_page, error_out=False
+    )
+    return {
+        'users': [user.to_dict() for user in pagination.items],
+        'total': pagination.total,
+        'pages': pagination.pages,
+        'page': filters['page'],
+        'per_page': per_page
+    }
 
 @auth_bp.route('/admin/users/<int:user_id>/status', methods=['PUT'])
 @jwt_required()
@@ -488,3 +589,37 @@ def toggle_user_status(user_id):
     user.is_active = not user.is_active
     db.session.commit()
     return {'message': f"User {'activated' if user.is_active else 'deactivated'} successfully"}
+
+@auth_bp.route('/admin/cache-stats', methods=['GET'])
+@jwt_required()
+@role_required(UserRole.ADMIN)
+def cache_stats():
+    """
+    Response cache statistics (admin only)
+    ---
+    tags:
+      - Authentication
+    security:
+      - Bearer: []
+    description: Hit and miss counters of the response cache, per endpoint, for the worker serving the request
+    responses:
+      200:
+        description: Cache statistics
+        schema:
+          type: object
+          properties:
+            backend:
+              type: string
+              example: "RedisCache"
+            endpoints:
+              type: object
+              example: {"categories.list_categories": {"hits": 120, "misses": 3, "hit_ratio": 0.976}}
+    """
+    endpoints = {}
+    for endpoint, counts in cache.stats().items():
+        total = counts['hits'] + counts['misses']
+        endpoints[endpoint] = dict(counts, hit_ratio=round(counts['hits'] / total, 3) if total else None)
+    return {
+        'backend': type(cache.backend).__name__,
+        'endpoints': endpoints
+    }
@@ -5,7 +5,7 @@ from sqlalchemy.exc import IntegrityError
 from models.category import ServiceCategory
 from schemas.service_schema import ServiceCategorySchema
 from extensions.extensions import db
-from utils.decorators import admin_required, validate_schema
+from utils.decorators import admin_required, cached_response, validate_schema
 
 category_bp = Blueprint('categories', __name__, url_prefix='/api/categories')
 
@@ -13,9 +13,8 @@ category_bp = Blueprint('categories', __name__, url_prefix='/api/categories')
 @jwt_required()
 @admin_required
 @validate_schema(ServiceCategorySchema())
-def create_category():
+def create_category(data):
     """Create a new service category (admin only)"""
-    data = request.get_json()
     
     category = ServiceCategory(
         name=data['name'],
@@ -33,12 +32,21 @@ def create_category():
         return {'message': 'Category with this name already exists'}, 400
 
 @category_bp.route('', methods=['GET'])
+@cached_response('categories')
 def list_categories():
     """List all active categories"""
     categories = ServiceCategory.query.filter_by(is_active=True).all()
-    return {'categories': [c.to_dict() for c in categories]}
+    parent_ids = ServiceCategory.parent_ids()
+    return {'categories': [c.to_dict(has_children=c.id in parent_ids) for c in categories]}
+
+@category_bp.route('/tree', methods=['GET'])
+@cached_response('categories')
+def category_tree():
+    """Get all active categories nested under their parents"""
+    return {'categories': ServiceCategory.get_tree()}
 
 @category_bp.route('/<int:category_id>', methods=['GET'])
+@cached_response('categories')
 def get_category(category_id):
     """Get category details"""
     category = ServiceCategory.query.get_or_404(category_id)
@@ -49,11 +57,18 @@ def get_category(category_id):
 @category_bp.route('/<int:category_id>', methods=['PUT'])
 @jwt_required()
 @admin_required
-@validate_schema(ServiceCategorySchema())
-def update_category(category_id):
+@validate_schema(ServiceCategorySchema(), partial=True)
+def update_category(category_id, data):
     """Update a category (admin only)"""
     category = ServiceCategory.query.get_or_404(category_id)
-    data = request.get_json()
+    
+    # A category cannot move under itself or one of its descendants
+    parent_id = data.get('parent_id')
+    if parent_id is not None and ServiceCategory.query.filter(
+        ServiceCategory.id == parent_id,
+        ServiceCategory.id.in_(ServiceCategory.subtree_ids(category.id))
+    ).first():
+        return {'message': 'Category cannot be its own ancestor'}, 400
     
     # Update fields
     for field in ['name', 'description', 'icon', 'parent_id']:
@@ -88,10 +103,9 @@ def delete_category(category_id):
 @jwt_required()
 @admin_required
 @validate_schema(ServiceCategorySchema())
-def create_subcategory(category_id):
+def create_subcategory(category_id, data):
     """Create a subcategory (admin only)"""
     parent = ServiceCategory.query.get_or_404(category_id)
-    data = request.get_json()
     
     subcategory = ServiceCategory(
         name=data['name'],
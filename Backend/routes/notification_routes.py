@@ -9,6 +9,9 @@ from schemas.notification_schema import (
 )
 from extensions.extensions import db
 from utils.decorators import validate_schema
+from utils.etag import collection_etag, not_modified, with_etag
+from utils.fieldsets import parse_fieldset
+from utils.pagination import keyset_paginate, wants_cursor_pagination
 
 notification_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
 
@@ -23,6 +26,10 @@ def list_notifications():
     notification_type = request.args.get('type')
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
+    try:
+        fieldset = parse_fieldset(request.args, Notification)
+    except ValueError as e:
+        return {'message': str(e)}, 400
     
     query = Notification.query.filter_by(user_id=current_user_id)
     
@@ -30,37 +37,62 @@ def list_notifications():
     if read is not None:
         query = query.filter(Notification.read == (read.lower() == 'true'))
     if notification_type:
-        query = query.filter(Notification.type == NotificationType[notification_type.upper()])
+        query = query.filter(Notification.notification_type == NotificationType[notification_type.upper()])
+    
+    # Conditional GET: one aggregate query decides whether the page can be skipped
+    etag = collection_etag(query, Notification, current_user_id, request.query_string)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    # Keyset pagination
+    if wants_cursor_pagination(request.args):
+        try:
+            result = keyset_paginate(
+                query, Notification, cursor=request.args.get('cursor'), per_page=per_page,
+                include_total=request.args.get('include_total', 'false').lower() == 'true'
+            )
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        
+        response = {
+            'items': [n.to_dict(fields=fieldset.fields) for n in result.items],
+            'next_cursor': result.next_cursor,
+            'per_page': per_page
+        }
+        if result.total is not None:
+            response['total'] = result.total
+        return with_etag(response, etag)
     
     # Pagination
     pagination = query.order_by(Notification.created_at.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    return {
-        'items': [n.to_dict() for n in pagination.items],
+    return with_etag({
+        'items': [n.to_dict(fields=fieldset.fields) for n in pagination.items],
         'total': pagination.total,
         'pages': pagination.pages,
         'page': page,
         'per_page': per_page
-    }
+    }, etag)
 
 @notification_bp.route('/unread-count', methods=['GET'])
 @jwt_required()
 def unread_count():
     """Get count of unread notifications"""
     current_user_id = get_jwt_identity()
-    count = Notification.query.filter_by(
-        user_id=current_user_id,
-        read=False
-    ).count()
-    return {'unread_count': count}
+    return {'unread_count': Notification.get_unread_count(current_user_id)}
 
 @notification_bp.route('/<int:notification_id>', methods=['GET'])
 @jwt_required()
 def get_notification(notification_id):
     """Get notification details"""
     current_user_id = get_jwt_identity()
+    try:
+        fieldset = parse_fieldset(request.args, Notification)
+    except ValueError as e:
+        return {'message': str(e)}, 400
     notification = Notification.query.filter_by(
         id=notification_id,
         user_id=current_user_id
@@ -72,24 +104,23 @@ def get_notification(notification_id):
         notification.read_at = datetime.utcnow()
         db.session.commit()
     
-    return notification.to_dict()
+    return notification.to_dict(fields=fieldset.fields)
 
 @notification_bp.route('/<int:notification_id>', methods=['PUT'])
 @jwt_required()
 @validate_schema(NotificationUpdateSchema())
-def update_notification(notification_id):
+def update_notification(notification_id, data):
     """Update notification (mark as read/unread)"""
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     notification = Notification.query.filter_by(
         id=notification_id,
         user_id=current_user_id
     ).first_or_404()
     
-    if 'read' in data:
-        notification.read = data['read']
-        notification.read_at = datetime.utcnow() if data['read'] else None
+    if 'is_read' in data:
+        notification.read = data['is_read']
+        notification.read_at = datetime.utcnow() if data['is_read'] else None
     
     db.session.commit()
     return notification.to_dict()
@@ -110,6 +141,10 @@ def mark_all_read():
     }, synchronize_session=False)
     
     db.session.commit()
+    
+    # Bulk updates bypass the ORM events, so adjust the cached counter here
+    Notification.adjust_unread_count(current_user_id, -updated)
+    
     return {'message': f'Marked {updated} notifications as read'}
 
 @notification_bp.route('/preferences', methods=['GET'])
@@ -122,44 +157,30 @@ def get_preferences():
 
 @notification_bp.route('/preferences', methods=['PUT'])
 @jwt_required()
-@validate_schema(NotificationPreferenceSchema())
-def update_preferences():
+@validate_schema(NotificationPreferenceSchema(), partial=True)
+def update_preferences(data):
     """Update notification preferences"""
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
-    # Update or create each preference
-    for pref_data in data['preferences']:
-        pref = NotificationPreference.query.filter_by(
-            user_id=current_user_id,
-            notification_type=NotificationType[pref_data['notification_type']]
-        ).first()
-        
-        if not pref:
-            pref = NotificationPreference(
-                user_id=current_user_id,
-                notification_type=NotificationType[pref_data['notification_type']]
-            )
-            db.session.add(pref)
-        
-        # Update channels
-        for channel in ['email', 'push', 'sms']:
-            if channel in pref_data:
-                setattr(pref, f'receive_{channel}', pref_data[channel])
+    preference = NotificationPreference.query.filter_by(user_id=current_user_id).first()
+    if not preference:
+        preference = NotificationPreference(user_id=current_user_id)
+        db.session.add(preference)
     
-    db.session.commit()
+    # Schema fields without a column here (sms, offers, quiet hours) are accepted but not stored
+    for field, column in NotificationPreference.SCHEMA_FIELDS.items():
+        if field in data:
+            setattr(preference, column, data[field])
     
-    # Return updated preferences
-    preferences = NotificationPreference.query.filter_by(user_id=current_user_id).all()
-    return {'preferences': [p.to_dict() for p in preferences]}
+    db.session.commit()
+    return {'preferences': [preference.to_dict()]}
 
 @notification_bp.route('/push/subscribe', methods=['POST'])
 @jwt_required()
 @validate_schema(PushNotificationSubscriptionSchema())
-def subscribe_push():
+def subscribe_push(data):
     """Subscribe to push notifications"""
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     # Check if subscription already exists
     subscription = PushSubscription.query.filter_by(
@@ -171,18 +192,14 @@ def subscribe_push():
         subscription = PushSubscription(
             user_id=current_user_id,
             endpoint=data['endpoint'],
-            keys=data['keys'],
-            auth_secret=data.get('auth'),
-            p256dh_key=data.get('p256dh')
+            user_agent=request.headers.get('User-Agent')
         )
         db.session.add(subscription)
-    else:
-        # Update existing subscription
-        subscription.keys = data['keys']
-        if 'auth' in data:
-            subscription.auth_secret = data['auth']
-        if 'p256dh' in data:
-            subscription.p256dh_key = data['p256dh']
+    
+    # Browsers rotate keys, so refresh them on every subscribe
+    subscription.auth = data['keys']['auth']
+    subscription.p256dh = data['keys']['p256dh']
+    subscription.is_active = True
     
     db.session.commit()
     return {'message': 'Push subscription updated'}, 200
@@ -190,10 +207,9 @@ def subscribe_push():
 @notification_bp.route('/push/unsubscribe', methods=['POST'])
 @jwt_required()
 @validate_schema(PushNotificationSubscriptionSchema(only=('endpoint',)))
-def unsubscribe_push():
+def unsubscribe_push(data):
     """Unsubscribe from push notifications"""
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     # Delete the subscription
     deleted = PushSubscription.query.filter_by(
@@ -4,22 +4,23 @@ from sqlalchemy import and_
 
 from models.rating import Rating
 from models.service import Service, ServiceStatus
-from models.user import UserRole
+from models.user import User, UserRole
 from schemas.rating_schema import (
     RatingCreateSchema, RatingUpdateSchema, RatingResponseSchema
 )
 from extensions.extensions import db
-from utils.decorators import validate_schema, role_required
+from utils.decorators import cached_response, validate_schema, role_required
+from utils.fieldsets import parse_fieldset
+from utils.pagination import keyset_paginate, wants_cursor_pagination
 
 rating_bp = Blueprint('ratings', __name__, url_prefix='/api/ratings')
 
 @rating_bp.route('', methods=['POST'])
 @jwt_required()
 @validate_schema(RatingCreateSchema())
-def create_rating():
+def create_rating(data):
     """Create a new rating and review"""
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     # Get the service and verify the user has completed it
     service = Service.query.filter_by(
@@ -53,6 +54,7 @@ def create_rating():
     return rating.to_dict(), 201
 
 @rating_bp.route('/provider/<int:provider_id>', methods=['GET'])
+@cached_response('ratings')
 def get_provider_ratings(provider_id):
     """Get all ratings for a provider"""
     # Check if provider exists and is active
@@ -66,18 +68,19 @@ def get_provider_ratings(provider_id):
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
     min_rating = request.args.get('min_rating', type=int)
+    try:
+        fieldset = parse_fieldset(request.args, Rating)
+    except ValueError as e:
+        return {'message': str(e)}, 400
     
-    # Build query
-    query = Rating.query.filter_by(provider_id=provider_id)
+    # Build query, loading only the relationships the response embeds
+    query = Rating.query.options(
+        *Rating.serialization_options(expand=fieldset.expand)
+    ).filter_by(provider_id=provider_id)
     
     if min_rating is not None:
         query = query.filter(Rating.rating >= min_rating)
     
-    # Paginate results
-    pagination = query.order_by(Rating.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-    
     # Get rating summary
     summary = {
         'average_rating': provider.average_rating,
@@ -85,9 +88,33 @@ def get_provider_ratings(provider_id):
         'rating_distribution': provider.rating_distribution
     }
     
+    # Keyset pagination
+    if wants_cursor_pagination(request.args):
+        try:
+            result = keyset_paginate(
+                query, Rating, cursor=request.args.get('cursor'), per_page=per_page,
+                include_total=request.args.get('include_total', 'false').lower() == 'true'
+            )
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        
+        pagination = {'next_cursor': result.next_cursor, 'per_page': per_page}
+        if result.total is not None:
+            pagination['total'] = result.total
+        return {
+            'summary': summary,
+            'ratings': [r.to_dict(fields=fieldset.fields, expand=fieldset.expand) for r in result.items],
+            'pagination': pagination
+        }
+    
+    # Paginate results
+    pagination = query.order_by(Rating.created_at.desc()).paginate(
+        page=page, per_page=per_page, error_out=False
+    )
+    
     return {
         'summary': summary,
-        'ratings': [r.to_dict() for r in pagination.items],
+        'ratings': [r.to_dict(fields=fieldset.fields, expand=fieldset.expand) for r in pagination.items],
         'pagination': {
             'total': pagination.total,
             'pages': pagination.pages,
@@ -97,15 +124,22 @@ def get_provider_ratings(provider_id):
     }
 
 @rating_bp.route('/<int:rating_id>', methods=['GET'])
+@cached_response('ratings')
 def get_rating(rating_id):
     """Get rating details"""
-    rating = Rating.query.get_or_404(rating_id)
-    return rating.to_dict()
+    try:
+        fieldset = parse_fieldset(request.args, Rating)
+    except ValueError as e:
+        return {'message': str(e)}, 400
+    rating = Rating.query.options(
+        *Rating.serialization_options(expand=fieldset.expand)
+    ).get_or_404(rating_id)
+    return rating.to_dict(fields=fieldset.fields, expand=fieldset.expand)
 
 @rating_bp.route('/<int:rating_id>', methods=['PUT'])
 @jwt_required()
 @validate_schema(RatingUpdateSchema())
-def update_rating(rating_id):
+def update_rating(rating_id, data):
     """Update a rating"""
     current_user_id = get_jwt_identity()
     rating = Rating.query.get_or_404(rating_id)
@@ -114,8 +148,6 @@ def update_rating(rating_id):
     if rating.reviewer_id != current_user_id:
         return {'message': 'Not authorized to update this rating'}, 403
     
-    data = request.get_json()
-    
     # Update fields
     if 'rating' in data:
         rating.rating = data['rating']
@@ -165,10 +197,9 @@ def report_rating(rating_id):
 @jwt_required()
 @role_required(UserRole.PROVIDER)
 @validate_schema(RatingResponseSchema())
-def respond_to_rating(rating_id):
+def respond_to_rating(rating_id, data):
     """Respond to a rating (provider only)"""
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     # Get the rating
     rating = Rating.query.get_or_404(rating_id)
@@ -189,10 +220,9 @@ def respond_to_rating(rating_id):
 @jwt_required()
 @role_required(UserRole.PROVIDER)
 @validate_schema(RatingResponseSchema())
-def update_rating_response(rating_id):
+def update_rating_response(rating_id, data):
     """Update a rating response (provider only)"""
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     # Get the rating
     rating = Rating.query.filter_by(
@@ -0,0 +1,100 @@
+from flask import Blueprint, request
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from marshmallow import EXCLUDE, ValidationError
+from sqlalchemy import or_
+
+from models.rating import Rating
+from models.service import Service, ServiceStatus
+from schemas.search_schema import SearchSchema
+from utils.search import parse_search_terms
+
+search_bp = Blueprint('search', __name__, url_prefix='/api/search')
+
+def _visible_services(user_id, role):
+    """Services the user may see, as in the service listing"""
+    query = Service.query.options(*Service.serialization_options(expand=()))
+    if role == 'CLIENT':
+        query = query.filter(Service.client_id == user_id)
+    elif role == 'PROVIDER':
+        query = query.filter(or_(Service.provider_id == user_id, Service.status == ServiceStatus.PENDING))
+    return query
+
+def _results(matches, per_page, serialize):
+    """One page of (row, highlights) matches; one extra row was fetched to tell if more follow"""
+    return {
+        'items': [dict(serialize(row), highlights=highlights) for row, highlights in matches[:per_page]],
+        'has_more': len(matches) > per_page
+    }
+
+@search_bp.route('', methods=['GET'])
+@jwt_required()
+def search():
+    """
+    Full-text search over services and ratings
+    ---
+    tags:
+      - Search
+    security:
+      - Bearer: []
+    description: |
+      Searches service titles and descriptions and rating comments, best
+      matches first. Words are stemmed, so common English endings are
+      ignored ("painting" finds "painted", "plumbers" finds "plumber"), and
+      the last word also matches as a prefix. Services are limited to those
+      the caller could list. Each result carries highlights: the matched
+      fields, HTML-escaped, with matches wrapped in <mark> and long text cut
+      to the passage around them.
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: Words to search for
+      - name: type
+        in: query
+        type: string
+        enum: [all, services, ratings]
+        default: all
+      - $ref: '#/parameters/page'
+      - name: per_page
+        in: query
+        type: integer
+        default: 10
+        maximum: 50
+    responses:
+      200:
+        description: |
+          Matching services and/or ratings, each as {items, has_more}
+      400:
+        description: Invalid query
+        schema:
+          $ref: '#/definitions/Error'
+    """
+    try:
+        options = SearchSchema().load(request.args, unknown=EXCLUDE)
+    except ValidationError as err:
+        return {'message': 'Validation error', 'errors': err.messages}, 400
+    try:
+        terms = parse_search_terms(options['q'])
+    except ValueError as e:
+        return {'message': str(e)}, 400
+    
+    per_page = options['per_page']
+    offset = (options['page'] - 1) * per_page
+    result = {}
+    
+    if options['type'] in ('all', 'services'):
+        matches = Service.search_index.search(
+            _visible_services(get_jwt_identity(), get_jwt().get('role')),
+            Service.id, terms, limit=per_page + 1, offset=offset
+        )
+        result['services'] = _results(matches, per_page, lambda service: service.to_dict(expand=()))
+    
+    if options['type'] in ('all', 'ratings'):
+        matches = Rating.search_index.search(
+            Rating.query.options(*Rating.serialization_options(expand=())),
+            Rating.id, terms, limit=per_page + 1, offset=offset
+        )
+        result['ratings'] = _results(matches, per_page, lambda rating: rating.to_dict(expand=()))
+    
+    return result
@@ -1,24 +1,56 @@
 from flask import Blueprint, request, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from sqlalchemy import or_
-from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from marshmallow import EXCLUDE, ValidationError
 
+from models.category import ServiceCategory
 from models.service import Service, ServiceStatus, ServiceImage, ServiceOffer, ServiceMessage
 from models.user import UserRole
+from models.notification import NotificationType
 from schemas.service_schema import (
     ServiceCreateSchema, ServiceUpdateSchema, ServiceFilterSchema,
     ServiceStatusUpdateSchema, ServiceAssignmentSchema, ServiceOfferSchema,
-    ServiceMessageSchema
+    ServiceMessageSchema, ServiceMessageFilterSchema, ServiceOfferFilterSchema
 )
 from extensions.extensions import db
+from tasks.tasks import dispatch_notification, enqueue, match_providers
 from utils.decorators import validate_schema, role_required, provider_required, admin_required
+from utils.etag import collection_etag, compute_etag, not_modified, with_etag
+from utils.fieldsets import parse_fieldset
+from utils.geo import bounding_box, haversine_distance
+from utils.pagination import keyset_paginate
 
 service_bp = Blueprint('services', __name__, url_prefix='/api/services')
 
+# Radius used when a location search omits one, in kilometers
+DEFAULT_SEARCH_RADIUS_KM = 10
+
+SORT_ORDERS = {
+    'newest': Service.created_at.desc(),
+    'oldest': Service.created_at.asc(),
+    'budget_high': Service.budget.desc(),
+    'budget_low': Service.budget.asc(),
+    'deadline_soonest': Service.deadline.asc()
+}
+
+# Notification sent to the other party for each status a user can set
+STATUS_NOTIFICATIONS = {
+    ServiceStatus.IN_PROGRESS: NotificationType.SERVICE_STARTED,
+    ServiceStatus.COMPLETED: NotificationType.SERVICE_COMPLETED,
+    ServiceStatus.CANCELLED: NotificationType.SERVICE_CANCELLED,
+    ServiceStatus.REJECTED: NotificationType.SERVICE_REJECTED
+}
+
+def _other_parties(service, user_id):
+    """Client and provider of a service, minus the user who acted"""
+    return [party for party in (service.client_id, service.provider_id)
+            if party is not None and party != user_id]
+
 @service_bp.route('', methods=['POST'])
 @jwt_required()
 @validate_schema(ServiceCreateSchema())
-def create_service():
+def create_service(data):
     """
     Create a new service request
     ---
@@ -84,28 +116,30 @@ def create_service():
           $ref: '#/definitions/Error'
     """
     current_user_id = get_jwt_identity()
-    data = request.get_json()
     
     # Create service
     service = Service(
         title=data['title'],
         description=data['description'],
         category_id=data['category_id'],
-        budget=float(data['budget']),
-        deadline=datetime.fromisoformat(data['deadline']),
+        budget=data['budget'],
+        deadline=data['deadline'],
         location=data['location'],
         client_id=current_user_id,
         status=ServiceStatus.PENDING
     )
     
     # Add optional location data
-    if 'latitude' in data and 'longitude' in data:
-        service.latitude = float(data['latitude'])
-        service.longitude = float(data['longitude'])
+    if data.get('latitude') is not None and data.get('longitude') is not None:
+        service.latitude = data['latitude']
+        service.longitude = data['longitude']
     
     db.session.add(service)
     db.session.commit()
     
+    # Provider matching and notification happen on a worker
+    enqueue(match_providers, service.id)
+    
     return service.to_dict(), 201
 
 @service_bp.route('', methods=['GET'])
@@ -133,6 +167,61 @@ def list_services():
         in: query
         type: integer
         description: Filter by category ID
+      - name: include_subcategories
+        in: query
+        type: boolean
+        default: false
+        description: Also match services in every descendant of category_id
+      - name: min_budget
+        in: query
+        type: number
+        description: Minimum budget
+      - name: max_budget
+        in: query
+        type: number
+        description: Maximum budget
+      - name: latitude
+        in: query
+        type: number
+        description: Latitude of the search origin (requires longitude)
+      - name: longitude
+        in: query
+        type: number
+        description: Longitude of the search origin (requires latitude)
+      - name: radius
+        in: query
+        type: integer
+        description: Search radius in kilometers (1-100, default 10)
+      - name: sort_by
+        in: query
+        type: string
+        enum: [newest, oldest, budget_high, budget_low, deadline_soonest, distance]
+        description: Sort order, defaults to distance for location searches and newest otherwise
+      - name: cursor
+        in: query
+        type: string
+        description: |
+          Opt into keyset pagination. Pass an empty value for the first page and
+          the returned next_cursor for the following ones. Ordering is newest first.
+      - name: include_total
+        in: query
+        type: boolean
+        description: In cursor mode, also return the total count (costs a COUNT query)
+      - name: fields
+        in: query
+        type: string
+        description: Comma-separated keys to return, e.g. id,title,status,budget
+      - name: expand
+        in: query
+        type: string
+        description: |
+          Comma-separated relationships to embed (client, provider, category).
+          Defaults to all three, or to those named in fields when fields is given;
+          pass an empty value to embed none.
+      - name: If-None-Match
+        in: header
+        type: string
+        description: ETag from a previous response; answered with 304 if the results are unchanged
     responses:
       200:
         description: List of services
@@ -155,6 +244,11 @@ def list_services():
             per_page:
               type: integer
               example: 10
+            next_cursor:
+              type: string
+              description: Cursor for the next page (cursor mode only, null on the last page)
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       401:
         description: Unauthorized
         schema:
@@ -164,13 +258,20 @@ def list_services():
     claims = get_jwt()
     
     # Parse query parameters
-    status = request.args.get('status')
-    category_id = request.args.get('category_id')
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 10))
+    try:
+        filters = ServiceFilterSchema().load(request.args, unknown=EXCLUDE)
+    except ValidationError as err:
+        return {'message': 'Validation error', 'errors': err.messages}, 400
+    page = filters['page']
+    per_page = filters['per_page']
+    try:
+        fieldset = parse_fieldset(request.args, Service)
+    except ValueError as e:
+        return {'message': str(e)}, 400
     
-    # Base query
-    query = Service.query
+    # Base query, shaped for to_dict() so each page costs a fixed number of
+    # queries; only the requested relationships are loaded
+    query = Service.query.options(*Service.serialization_options(expand=fieldset.expand))
     
     # Filter by user role
     if claims.get('role') == 'CLIENT':
@@ -185,23 +286,81 @@ def list_services():
         )
     
     # Apply filters
-    if status:
-        query = query.filter(Service.status == ServiceStatus[status.upper()])
-    if category_id:
-        query = query.filter(Service.category_id == category_id)
+    if filters['status'] != 'all':
+        query = query.filter(Service.status == ServiceStatus[filters['status'].upper()])
+    if 'category_id' in filters:
+        if filters['include_subcategories']:
+            query = query.filter(Service.category_id.in_(ServiceCategory.subtree_ids(filters['category_id'])))
+        else:
+            query = query.filter(Service.category_id == filters['category_id'])
+    if 'min_budget' in filters:
+        query = query.filter(Service.budget >= filters['min_budget'])
+    if 'max_budget' in filters:
+        query = query.filter(Service.budget <= filters['max_budget'])
+    
+    # Radius search: bounding box on the (latitude, longitude) index first,
+    # then the exact haversine distance on the remaining rows
+    distance = None
+    if 'latitude' in filters:
+        latitude, longitude = filters['latitude'], filters['longitude']
+        radius = filters.get('radius', DEFAULT_SEARCH_RADIUS_KM)
+        min_lat, max_lat, lng_ranges = bounding_box(latitude, longitude, radius)
+        distance = haversine_distance(Service.latitude, Service.longitude, latitude, longitude)
+        query = query.filter(
+            Service.latitude.between(min_lat, max_lat),
+            or_(*(Service.longitude.between(min_lng, max_lng) for min_lng, max_lng in lng_ranges)),
+            distance <= radius
+        ).add_columns(distance.label('distance_km'))
+    
+    # Conditional GET: one aggregate query decides whether the page can be skipped
+    etag = collection_etag(query, Service, current_user_id, claims.get('role'), request.query_string,
+                           related=[name for name in Service.EXPANDABLE if name in fieldset.expand])
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    def serialize(rows):
+        if distance is None:
+            return [service.to_dict(fields=fieldset.fields, expand=fieldset.expand) for service in rows]
+        return [
+            dict(service.to_dict(fields=fieldset.fields, expand=fieldset.expand), distance_km=round(distance_km, 3))
+            for service, distance_km in rows
+        ]
+    
+    # Keyset pagination
+    if 'cursor' in filters:
+        try:
+            result = keyset_paginate(
+                query, Service, cursor=filters['cursor'], per_page=per_page,
+                include_total=filters['include_total']
+            )
+        except ValueError as e:
+            return {'message': str(e)}, 400
+        
+        response = {
+            'items': serialize(result.items),
+            'next_cursor': result.next_cursor,
+            'per_page': per_page
+        }
+        if result.total is not None:
+            response['total'] = result.total
+        return with_etag(response, etag)
+    
+    sort_by = filters['sort_by'] or ('distance' if distance is not None else 'newest')
+    order_by = distance if sort_by == 'distance' else SORT_ORDERS[sort_by]
     
     # Pagination
-    pagination = query.order_by(Service.created_at.desc()).paginate(
+    pagination = query.order_by(order_by, Service.id.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     
-    return {
-        'items': [service.to_dict() for service in pagination.items],
+    return with_etag({
+        'items': serialize(pagination.items),
         'total': pagination.total,
         'pages': pagination.pages,
         'page': page,
         'per_page': per_page
-    }
+    }, etag)
 
 @service_bp.route('/<int:service_id>', methods=['GET'])
 @jwt_required()
@@ -219,11 +378,28 @@ def get_service(service_id):
         type: integer
         required: true
         description: ID of the service to retrieve
+      - name: fields
+        in: query
+        type: string
+        description: Comma-separated keys to return, e.g. id,title,status,budget
+      - name: expand
+        in: query
+        type: string
+        description: |
+          Comma-separated relationships to embed (client, provider, category).
+          Defaults to all three, or to those named in fields when fields is given;
+          pass an empty value to embed none.
+      - name: If-None-Match
+        in: header
+        type: string
+        description: ETag from a previous response; answered with 304 if the service is unchanged
     responses:
       200:
         description: Service details
         schema:
           $ref: '#/definitions/Service'
+      304:
+        description: Not modified since the ETag sent in If-None-Match
       401:
         description: Unauthorized
         schema:
@@ -239,8 +415,14 @@ def get_service(service_id):
     """
     current_user_id = get_jwt_identity()
     claims = get_jwt()
+    try:
+        fieldset = parse_fieldset(request.args, Service)
+    except ValueError as e:
+        return {'message': str(e)}, 400
     
-    service = Service.query.get_or_404(service_id)
+    service = Service.query.options(
+        *Service.serialization_options(expand=fieldset.expand)
+    ).get_or_404(service_id)
     
     # Check permissions
     if claims.get('role') == 'CLIENT' and service.client_id != current_user_id:
@@ -248,12 +430,22 @@ def get_service(service_id):
     if claims.get('role') == 'PROVIDER' and service.provider_id != current_user_id and service.status != ServiceStatus.PENDING:
         return {'message': 'Not authorized to view this service'}, 403
     
-    return service.to_dict()
+    # Everything to_dict() renders is already loaded, so check before serializing
+    related = [getattr(service, name) for name in Service.EXPANDABLE if name in fieldset.expand]
+    etag = compute_etag(
+        request.query_string,
+        *[(obj.id, obj.updated_at) if obj else None for obj in (service, *related)]
+    )
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    return with_etag(service.to_dict(fields=fieldset.fields, expand=fieldset.expand), etag)
 
 @service_bp.route('/<int:service_id>', methods=['PUT'])
 @jwt_required()
 @validate_schema(ServiceUpdateSchema())
-def update_service(service_id):
+def update_service(service_id, data):
     """
     Update service details
     ---
@@ -315,6 +507,10 @@ def update_service(service_id):
         description: Service not found
         schema:
           $ref: '#/definitions/Error'
+      409:
+        description: The status was changed by another request in the meantime
+        schema:
+          $ref: '#/definitions/Error'
     """
     current_user_id = get_jwt_identity()
     service = Service.query.get_or_404(service_id)
@@ -323,16 +519,20 @@ def update_service(service_id):
     if service.client_id != current_user_id and get_jwt().get('role') != 'ADMIN':
         return {'message': 'Not authorized to update this service'}, 403
     
-    data = request.get_json()
-    
     # Update fields
-    for field in ['title', 'description', 'budget', 'deadline', 'location', 'status']:
+    for field in ['title', 'description', 'budget', 'deadline', 'location']:
         if field in data:
             setattr(service, field, data[field])
-    
     if 'latitude' in data and 'longitude' in data:
-        service.latitude = float(data['latitude'])
-        service.longitude = float(data['longitude'])
+        service.latitude = data['latitude']
+        service.longitude = data['longitude']
+    
+    if 'status' in data:
+        try:
+            service.change_status(ServiceStatus[data['status'].upper()])
+        except ValueError as e:
+            db.session.rollback()
+            return {'message': str(e)}, 409
     
     db.session.commit()
     return service.to_dict()
@@ -341,7 +541,7 @@ def update_service(service_id):
 @jwt_required()
 @validate_schema(ServiceAssignmentSchema())
 @provider_required
-def assign_self(service_id):
+def assign_self(service_id, data):
     """
     Assign self to a service (provider only)
     ---
@@ -387,36 +587,42 @@ def assign_self(service_id):
           $ref: '#/definitions/Error'
     """
     current_user_id = get_jwt_identity()
-    service = Service.query.get_or_404(service_id)
-    data = request.get_json()
+    service = Service.query.options(*Service.serialization_options()).get_or_404(service_id)
     
-    # Check if service is available
-    if service.status != ServiceStatus.PENDING:
+    # Assign provider; the conditional UPDATE lets exactly one of several
+    # providers racing for the same service win
+    try:
+        service.assign_provider(current_user_id)
+    except ValueError:
+        db.session.rollback()
         return {'message': 'Service is not available for assignment'}, 400
     
-    # Assign provider
-    service.provider_id = current_user_id
-    service.status = ServiceStatus.ASSIGNED
-    service.assigned_at = datetime.utcnow()
-    
     # Add assignment message
     message = ServiceMessage(
         service_id=service.id,
         sender_id=current_user_id,
-        message=data.get('message', 'I\'ve been assigned to this service')
+        message=data.get('message') or 'I\'ve been assigned to this service'
     )
     
     db.session.add(message)
     db.session.commit()
     
-    # TODO: Send notification to client
+    enqueue(
+        dispatch_notification,
+        [service.client_id],
+        NotificationType.SERVICE_ACCEPTED.value,
+        'Provider assigned',
+        f'A provider has been assigned to "{service.title}"',
+        'service',
+        service.id
+    )
     
     return service.to_dict()
 
 @service_bp.route('/<int:service_id>/status', methods=['PUT'])
 @jwt_required()
 @validate_schema(ServiceStatusUpdateSchema())
-def update_status(service_id):
+def update_status(service_id, data):
     """
     Update service status
     ---
@@ -463,11 +669,14 @@ def update_status(service_id):
         description: Service not found
         schema:
           $ref: '#/definitions/Error'
+      409:
+        description: The status was changed by another request in the meantime
+        schema:
+          $ref: '#/definitions/Error'
     """
     current_user_id = get_jwt_identity()
     claims = get_jwt()
-    service = Service.query.get_or_404(service_id)
-    data = request.get_json()
+    service = Service.query.options(*Service.serialization_options()).get_or_404(service_id)
     
     # Check permissions
     if claims.get('role') == 'CLIENT' and service.client_id != current_user_id:
@@ -475,16 +684,13 @@ def update_status(service_id):
     if claims.get('role') == 'PROVIDER' and service.provider_id != current_user_id:
         return {'message': 'Not authorized to update this service'}, 403
     
-    # Update status
+    # Update status, unless another request changed it first
     new_status = ServiceStatus[data['status'].upper()]
-    service.status = new_status
-    
-    # Update timestamps
-    now = datetime.utcnow()
-    if new_status == ServiceStatus.IN_PROGRESS:
-        service.started_at = now
-    elif new_status == ServiceStatus.COMPLETED:
-        service.completed_at = now
+    try:
+        service.change_status(new_status)
+    except ValueError as e:
+        db.session.rollback()
+        return {'message': str(e)}, 409
     
     # Add status update message
     message = ServiceMessage(
@@ -492,13 +698,23 @@ def update_status(service_id):
         sender_id=current_user_id,
         message=f"Status updated to {data['status']}"
     )
-    if 'notes' in data:
+    if data.get('notes'):
         message.message += f": {data['notes']}"
     
     db.session.add(message)
     db.session.commit()
     
-    # TODO: Send notification to the other party
+    recipients = _other_parties(service, current_user_id)
+    if recipients:
+        enqueue(
+            dispatch_notification,
+            recipients,
+            STATUS_NOTIFICATIONS[new_status].value,
+            'Service update',
+            f'"{service.title}" is now {new_status.value.replace("_", " ")}',
+            'service',
+            service.id
+        )
     
     return service.to_dict()
 
@@ -512,19 +728,51 @@ def get_messages(service_id):
       - Services
     security:
       - Bearer: []
+    description: |
+      Returns a window of the conversation, oldest first. Poll for new messages
+      with after_id set to the last id received, scroll back with before_id set
+      to the first one. The other party's messages returned are marked read.
     parameters:
       - name: service_id
         in: path
         type: integer
         required: true
         description: ID of the service
+      - name: after_id
+        in: query
+        type: integer
+        description: Only messages after this id
+      - name: before_id
+        in: query
+        type: integer
+        description: Only messages before this id
+      - name: limit
+        in: query
+        type: integer
+        default: 50
+        description: Maximum number of messages (1-100)
+      - name: mark_read
+        in: query
+        type: boolean
+        default: true
+        description: Mark the returned messages from the other party as read
     responses:
       200:
         description: List of service messages
         schema:
-          type: array
-          items:
-            $ref: '#/definitions/ServiceMessage'
+          type: object
+          properties:
+            messages:
+              type: array
+              items:
+                $ref: '#/definitions/ServiceMessage'
+            has_more:
+              type: boolean
+              description: More messages exist beyond this window in the direction read
+      400:
+        description: Invalid window parameters
+        schema:
+          $ref: '#/definitions/Error'
       401:
         description: Unauthorized
         schema:
@@ -539,22 +787,41 @@ def get_messages(service_id):
           $ref: '#/definitions/Error'
     """
     current_user_id = get_jwt_identity()
+    try:
+        window = ServiceMessageFilterSchema().load(request.args, unknown=EXCLUDE)
+    except ValidationError as err:
+        return {'message': 'Validation error', 'errors': err.messages}, 400
+    
     service = Service.query.get_or_404(service_id)
     
     # Check permissions
-    if service.client_id != current_user_id and service.provider_id != current_user_id and get_jwt().get('role') != 'ADMIN':
+    is_party = current_user_id in (service.client_id, service.provider_id)
+    if not is_party and get_jwt().get('role') != 'ADMIN':
         return {'message': 'Not authorized to view these messages'}, 403
     
-    messages = ServiceMessage.query.filter_by(service_id=service_id)\
-        .order_by(ServiceMessage.created_at.asc())\
-        .all()
+    messages, has_more = ServiceMessage.window(
+        service_id,
+        after_id=window.get('after_id'),
+        before_id=window.get('before_id'),
+        limit=window['limit']
+    )
+    
+    # Only the parties' reads count, not an admin looking in. The UPDATE
+    # also flips is_read on the loaded rows, so serialize before the commit
+    # expires them
+    marked = 0
+    if messages and is_party and window['mark_read']:
+        marked = ServiceMessage.mark_read(service_id, current_user_id, messages[0].id, messages[-1].id)
+    response = {'messages': [msg.to_dict() for msg in messages], 'has_more': has_more}
+    if marked:
+        db.session.commit()
     
-    return {'messages': [msg.to_dict() for msg in messages]}
+    return response
 
 @service_bp.route('/<int:service_id>/messages', methods=['POST'])
 @jwt_required()
 @validate_schema(ServiceMessageSchema())
-def send_message(service_id):
+def send_message(service_id, data):
     """
     Send a message for a service
     ---
@@ -603,7 +870,6 @@ def send_message(service_id):
     """
     current_user_id = get_jwt_identity()
     service = Service.query.get_or_404(service_id)
-    data = request.get_json()
     
     # Check permissions - only client, provider, or admin can message
     if service.client_id != current_user_id and service.provider_id != current_user_id and get_jwt().get('role') != 'ADMIN':
@@ -619,6 +885,318 @@ def send_message(service_id):
     db.session.add(message)
     db.session.commit()
     
-    # TODO: Send notification to the other party
+    recipients = _other_parties(service, current_user_id)
+    if recipients:
+        enqueue(
+            dispatch_notification,
+            recipients,
+            NotificationType.NEW_MESSAGE.value,
+            'New message',
+            f'New message about "{service.title}"',
+            'service',
+            service.id
+        )
     
     return message.to_dict(), 201
+
+@service_bp.route('/<int:service_id>/offers', methods=['POST'])
+@jwt_required()
+@validate_schema(ServiceOfferSchema())
+@provider_required
+def create_offer(service_id, data):
+    """
+    Make an offer on a service (provider only)
+    ---
+    tags:
+      - Services
+    security:
+      - Bearer: []
+    parameters:
+      - name: service_id
+        in: path
+        type: integer
+        required: true
+        description: ID of the service
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - amount
+          properties:
+            amount:
+              type: number
+              example: 150.00
+            message:
+              type: string
+              example: "I can do this tomorrow morning"
+    responses:
+      201:
+        description: Offer created
+      400:
+        description: Service is not open for offers, or a pending offer already exists
+        schema:
+          $ref: '#/definitions/Error'
+      401:
+        description: Unauthorized
+        schema:
+          $ref: '#/definitions/Error'
+      403:
+        description: Forbidden - Only providers can make offers
+        schema:
+          $ref: '#/definitions/Error'
+      404:
+        description: Service not found
+        schema:
+          $ref: '#/definitions/Error'
+    """
+    current_user_id = get_jwt_identity()
+    service = Service.query.get_or_404(service_id)
+    
+    if service.status != ServiceStatus.PENDING:
+        return {'message': 'Service is not open for offers'}, 400
+    if service.client_id == current_user_id:
+        return {'message': 'You cannot make an offer on your own service'}, 400
+    
+    offer = ServiceOffer(
+        service_id=service.id,
+        provider_id=current_user_id,
+        amount=data['amount'],
+        message=data.get('message')
+    )
+    db.session.add(offer)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # ix_service_offers_pending_provider allows one pending offer per provider
+        db.session.rollback()
+        return {'message': 'You already have a pending offer on this service'}, 400
+    
+    enqueue(
+        dispatch_notification,
+        [service.client_id],
+        NotificationType.NEW_OFFER.value,
+        'New offer',
+        f'New offer of {offer.amount} on "{service.title}"',
+        'service',
+        service.id
+    )
+    
+    return offer.to_dict(), 201
+
+@service_bp.route('/<int:service_id>/offers', methods=['GET'])
+@jwt_required()
+def list_offers(service_id):
+    """
+    List the offers on a service, lowest amount first
+    ---
+    tags:
+      - Services
+    security:
+      - Bearer: []
+    description: |
+      The service's client and admins see every offer plus a summary of the
+      pending ones; providers only see their own offers.
+    parameters:
+      - name: service_id
+        in: path
+        type: integer
+        required: true
+        description: ID of the service
+      - name: status
+        in: query
+        type: string
+        enum: [pending, accepted, rejected, withdrawn]
+        default: pending
+      - name: limit
+        in: query
+        type: integer
+        default: 10
+        description: Number of offers to return (1-100), best first
+    responses:
+      200:
+        description: Offers and, for the client, the pending-offer summary
+        schema:
+          type: object
+          properties:
+            offers:
+              type: array
+              items:
+                type: object
+            summary:
+              type: object
+              properties:
+                count:
+                  type: integer
+                lowest:
+                  type: number
+                median:
+                  type: number
+      400:
+        description: Invalid filters
+        schema:
+          $ref: '#/definitions/Error'
+      403:
+        description: Forbidden - Not authorized to view offers for this service
+        schema:
+          $ref: '#/definitions/Error'
+      404:
+        description: Service not found
+        schema:
+          $ref: '#/definitions/Error'
+    """
+    current_user_id = get_jwt_identity()
+    role = get_jwt().get('role')
+    try:
+        filters = ServiceOfferFilterSchema().load(request.args, unknown=EXCLUDE)
+    except ValidationError as err:
+        return {'message': 'Validation error', 'errors': err.messages}, 400
+    
+    service = Service.query.get_or_404(service_id)
+    
+    if role == 'PROVIDER':
+        # Providers only see their own bids, never the competition
+        offers = ServiceOffer.best(
+            service.id, limit=filters['limit'], status=filters['status'], provider_id=current_user_id
+        )
+        return {'offers': [offer.to_dict() for offer in offers]}
+    
+    if service.client_id != current_user_id and role != 'ADMIN':
+        return {'message': 'Not authorized to view offers for this service'}, 403
+    
+    offers = ServiceOffer.best(service.id, limit=filters['limit'], status=filters['status'])
+    return {
+        'offers': [offer.to_dict() for offer in offers],
+        'summary': ServiceOffer.get_summary(service.id)
+    }
+
+@service_bp.route('/<int:service_id>/offers/<int:offer_id>/accept', methods=['POST'])
+@jwt_required()
+def accept_offer(service_id, offer_id):
+    """
+    Accept an offer (service client only)
+    ---
+    tags:
+      - Services
+    security:
+      - Bearer: []
+    description: |
+      Assigns the offer's provider to the service and rejects every other
+      pending offer on it.
+    parameters:
+      - name: service_id
+        in: path
+        type: integer
+        required: true
+      - name: offer_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Offer accepted and provider assigned
+        schema:
+          type: object
+          properties:
+            offer:
+              type: object
+            service:
+              $ref: '#/definitions/Service'
+      400:
+        description: Offer or service is no longer pending
+        schema:
+          $ref: '#/definitions/Error'
+      403:
+        description: Forbidden - Only the service's client can accept offers
+        schema:
+          $ref: '#/definitions/Error'
+      404:
+        description: Offer not found
+        schema:
+          $ref: '#/definitions/Error'
+    """
+    current_user_id = get_jwt_identity()
+    offer = ServiceOffer.query.filter_by(id=offer_id, service_id=service_id).first_or_404()
+    service = offer.service
+    
+    if service.client_id != current_user_id and get_jwt().get('role') != 'ADMIN':
+        return {'message': 'Only the client can accept offers for this service'}, 403
+    
+    try:
+        rejected = offer.accept()
+    except ValueError as e:
+        db.session.rollback()
+        return {'message': str(e)}, 400
+    db.session.commit()
+    
+    enqueue(
+        dispatch_notification,
+        [offer.provider_id],
+        NotificationType.OFFER_ACCEPTED.value,
+        'Offer accepted',
+        f'Your offer on "{service.title}" was accepted',
+        'service',
+        service.id
+    )
+    if rejected:
+        enqueue(
+            dispatch_notification,
+            rejected,
+            NotificationType.OFFER_REJECTED.value,
+            'Offer not selected',
+            f'Another offer was accepted for "{service.title}"',
+            'service',
+            service.id
+        )
+    
+    return {'offer': offer.to_dict(), 'service': service.to_dict()}
+
+@service_bp.route('/<int:service_id>/offers/<int:offer_id>/withdraw', methods=['POST'])
+@jwt_required()
+def withdraw_offer(service_id, offer_id):
+    """
+    Withdraw a pending offer (offering provider only)
+    ---
+    tags:
+      - Services
+    security:
+      - Bearer: []
+    parameters:
+      - name: service_id
+        in: path
+        type: integer
+        required: true
+      - name: offer_id
+        in: path
+        type: integer
+        required: true
+    responses:
+      200:
+        description: Offer withdrawn
+      400:
+        description: Offer is no longer pending
+        schema:
+          $ref: '#/definitions/Error'
+      403:
+        description: Forbidden - Not your offer
+        schema:
+          $ref: '#/definitions/Error'
+      404:
+        description: Offer not found
+        schema:
+          $ref: '#/definitions/Error'
+    """
+    current_user_id = get_jwt_identity()
+    offer = ServiceOffer.query.filter_by(id=offer_id, service_id=service_id).first_or_404()
+    
+    if offer.provider_id != current_user_id:
+        return {'message': 'You can only withdraw your own offers'}, 403
+    
+    try:
+        offer.withdraw()
+    except ValueError as e:
+        return {'message': str(e)}, 400
+    db.session.commit()
+    
+    return offer.to_dict()
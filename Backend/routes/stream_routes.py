@@ -0,0 +1,161 @@
+import json
+from flask import Blueprint, Response, request, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func, or_
+
+from models.notification import Notification
+from models.service import Service, ServiceMessage
+from extensions.extensions import db, pubsub
+from utils.pubsub import user_channel
+
+stream_bp = Blueprint('stream', __name__, url_prefix='/api/stream')
+
+def _participant_messages(user_id):
+    """Query for messages on every service the user is a party to"""
+    return ServiceMessage.query.join(Service, Service.id == ServiceMessage.service_id).filter(
+        or_(Service.client_id == user_id, Service.provider_id == user_id)
+    )
+
+def _latest_ids(user_id):
+    """The newest notification and message ids the user can see"""
+    last_notification_id = db.session.query(func.max(Notification.id)).filter(
+        Notification.user_id == user_id
+    ).scalar() or 0
+    last_message_id = _participant_messages(user_id).with_entities(
+        func.max(ServiceMessage.id)
+    ).scalar() or 0
+    return last_notification_id, last_message_id
+
+def _parse_last_event_id(value):
+    """Event ids are '<notification_id>-<message_id>' high-water marks"""
+    try:
+        notification_id, message_id = value.split('-')
+        return int(notification_id), int(message_id)
+    except (AttributeError, ValueError):
+        return None
+
+def _format_event(event, event_id, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+@stream_bp.route('', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_events():
+    """
+    Stream realtime notifications and service messages
+    ---
+    tags:
+      - Notifications
+    security:
+      - Bearer: []
+    description: |
+      Server-Sent Events stream of new notifications and messages on the
+      user's services. Browsers' EventSource cannot set headers, so the
+      token may also be passed as the `jwt` query parameter.
+
+      Every event id is a `<notification_id>-<message_id>` high-water mark.
+      EventSource resends it as Last-Event-ID on reconnect and anything
+      missed in between is replayed before live events resume. When more
+      than SSE_REPLAY_LIMIT notifications or messages were missed, nothing
+      is replayed: a `reset` event tells the client to refetch both lists
+      instead, and live events resume after it.
+    produces:
+      - text/event-stream
+    parameters:
+      - name: Last-Event-ID
+        in: header
+        type: string
+        description: Resume after this event id
+      - name: last_event_id
+        in: query
+        type: string
+        description: Same as the Last-Event-ID header, for clients that cannot set it
+    responses:
+      200:
+        description: Event stream (events `notification`, `message` and `reset`)
+      401:
+        description: Unauthorized
+        schema:
+          $ref: '#/definitions/Error'
+    """
+    current_user_id = get_jwt_identity()
+    config = current_app.config
+    heartbeat_interval = config.get('SSE_HEARTBEAT_INTERVAL', 15)
+    replay_limit = config.get('SSE_REPLAY_LIMIT', 100)
+
+    # Subscribe before reading the database so nothing committed in between is lost;
+    # duplicates are dropped below using the high-water marks
+    subscription = pubsub.subscribe([user_channel(current_user_id)])
+
+    resume = _parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    )
+    replay = []
+    reset = False
+    if resume:
+        last_notification_id, last_message_id = resume
+        # One row past the limit tells whether the replay would be cut short
+        notifications = Notification.query.filter(
+            Notification.user_id == current_user_id,
+            Notification.id > last_notification_id
+        ).order_by(Notification.id).limit(replay_limit + 1).all()
+        messages = _participant_messages(current_user_id).filter(
+            ServiceMessage.id > last_message_id
+        ).order_by(ServiceMessage.id).limit(replay_limit + 1).all()
+        reset = len(notifications) > replay_limit or len(messages) > replay_limit
+
+    if reset:
+        # Too far behind to replay; the client refetches and resumes from now
+        last_notification_id, last_message_id = _latest_ids(current_user_id)
+    elif resume:
+        replay = [('notification', n.id, n.created_at, n.to_dict()) for n in notifications] + \
+            [('message', m.id, m.created_at, {
+                'id': m.id,
+                'service_id': m.service_id,
+                'sender_id': m.sender_id,
+                'message': m.message,
+                'is_read': m.is_read,
+                'created_at': m.created_at.isoformat() if m.created_at else None
+            }) for m in messages]
+        replay.sort(key=lambda item: (item[2] is None, item[2]))
+    else:
+        last_notification_id, last_message_id = _latest_ids(current_user_id)
+
+    # Hand the connection back to the pool; the stream itself needs no database access
+    db.session.remove()
+
+    def generate():
+        marks = {'notification': last_notification_id, 'message': last_message_id}
+        # The client already has everything up to the starting marks; rows that were
+        # both replayed and published while we were reading must not be sent twice
+        floor = dict(marks)
+        replayed = {(event, row_id) for event, row_id, _, _ in replay}
+
+        def emit(event, row_id, data):
+            marks[event] = max(marks[event], row_id)
+            return _format_event(event, f"{marks['notification']}-{marks['message']}", data)
+
+        try:
+            yield f"retry: {config.get('SSE_RETRY_MS', 5000)}\n\n"
+            if reset:
+                yield _format_event('reset', f"{marks['notification']}-{marks['message']}",
+                                    {'reason': 'replay_limit'})
+            for event, row_id, _, data in replay:
+                yield emit(event, row_id, data)
+
+            while True:
+                received = subscription.get(timeout=heartbeat_interval)
+                if received is None:
+                    yield ": heartbeat\n\n"
+                    continue
+                _, message = received
+                event = message.get('event')
+                if event not in marks or message['id'] <= floor[event] or (event, message['id']) in replayed:
+                    continue
+                yield emit(event, message['id'], message['data'])
+        finally:
+            subscription.close()
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
@@ -70,6 +70,54 @@ def seed_db():
     db.session.commit()
     click.echo('Database seeded with initial data.')
 
+@app.cli.command("rebuild-rating-stats")
+@click.option('--provider-id', type=int, default=None, help='Only rebuild this provider')
+def rebuild_rating_stats(provider_id):
+    """Rebuild the materialized provider rating stats from the ratings table."""
+    from models.rating import ProviderRatingStats
+    
+    click.echo('Rebuilding provider rating stats...')
+    count = ProviderRatingStats.rebuild(provider_id=provider_id)
+    click.echo(f'Rebuilt rating stats for {count} provider(s).')
+
+@app.cli.command("reconcile-unread-counts")
+def reconcile_unread_counts():
+    """Repair drift between cached unread counters and the notifications table."""
+    from models.notification import Notification
+    
+    corrected = Notification.reconcile_unread_counts()
+    click.echo(f'Corrected {corrected} unread counter(s).')
+
+@app.cli.command("export-data")
+@click.argument('datasets', nargs=-1)
+@click.option('--format', 'fmt', type=click.Choice(['ndjson', 'csv', 'parquet']), default='ndjson',
+              help='Output format')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d']),
+              default=None, help='Only export rows updated after this watermark (UTC)')
+@click.option('--output-dir', type=click.Path(file_okay=False), default='.', help='Directory to write into')
+def export_data(datasets, fmt, since, output_dir):
+    """Export tables for analytics, all from one consistent snapshot."""
+    from services.export_service import ExportService
+    
+    datasets = datasets or tuple(ExportService.DATASETS)
+    unknown = set(datasets) - set(ExportService.DATASETS)
+    if unknown:
+        raise click.BadParameter(f"unknown dataset(s): {', '.join(sorted(unknown))}", param_hint='DATASETS')
+    
+    os.makedirs(output_dir, exist_ok=True)
+    with ExportService.snapshot() as connection:
+        for dataset in datasets:
+            try:
+                watermark, chunks = ExportService.export(connection, dataset, fmt, since=since)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            path = os.path.join(output_dir, f'{dataset}.{fmt}')
+            with open(path, 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            watermark = watermark or since
+            click.echo(f"Exported {dataset} to {path} (watermark: {watermark.isoformat() if watermark else 'none'})")
+
 if __name__ == '__main__':
     # Run the development server
     app.run(host='0.0.0.0', port=5000, debug=debug)
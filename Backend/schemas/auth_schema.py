@@ -89,3 +89,19 @@ class UserUpdateSchema(Schema):
     def validate_phone(self, value):
         if not re.match(r'^\+?[1-9]\d{9,14}$', value):
             raise ValidationError("Invalid phone number format. Please use format: +1234567890")
+
+class UserFilterSchema(Schema):
+    """Schema for filtering the admin user listing"""
+    role = fields.Str(validate=validate.OneOf([role.value for role in UserRole]))
+    is_active = fields.Bool()
+    # Prefix of email, first name, last name or phone
+    q = fields.Str(validate=validate.Length(min=1, max=120))
+    page = fields.Int(validate=validate.Range(min=1), load_default=1)
+    per_page = fields.Int(validate=validate.Range(min=1, max=100), load_default=20)
+    
+    # Keyset pagination (opt-in by passing cursor, empty for the first page)
+    cursor = fields.Str(required=False)
+    include_total = fields.Bool(load_default=False)
+    
+    # json pages the results, ndjson and csv stream every match
+    format = fields.Str(validate=validate.OneOf(['json', 'ndjson', 'csv']), load_default='json')
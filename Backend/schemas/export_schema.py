@@ -0,0 +1,9 @@
+from datetime import timezone
+from marshmallow import Schema, fields, validate
+from services.export_service import EXPORT_FORMATS
+
+class ExportSchema(Schema):
+    """Schema for bulk data export options"""
+    format = fields.Str(validate=validate.OneOf(EXPORT_FORMATS), load_default='ndjson')
+    # Watermark from a previous export; only rows updated after it are returned
+    since = fields.NaiveDateTime(timezone=timezone.utc, required=False)
@@ -74,12 +74,14 @@ class PushNotificationSubscriptionSchema(Schema):
 class NotificationPreferenceSchema(Schema):
     """Schema for user notification preferences"""
     email_enabled = fields.Bool(load_default=True)
+    email_frequency = fields.Str(load_default='immediate', validate=validate.OneOf(['immediate', 'daily', 'weekly']))
     push_enabled = fields.Bool(load_default=True)
     sms_enabled = fields.Bool(load_default=True)
     
     # Notification type specific preferences
     service_updates = fields.Bool(load_default=True)
     messages = fields.Bool(load_default=True)
+    rating_updates = fields.Bool(load_default=True)
     offers = fields.Bool(load_default=True)
     promotions = fields.Bool(load_default=True)
     account_updates = fields.Bool(load_default=True)
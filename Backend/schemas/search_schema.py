@@ -0,0 +1,10 @@
+from marshmallow import Schema, fields, validate
+
+SEARCH_TYPES = ('all', 'services', 'ratings')
+
+class SearchSchema(Schema):
+    """Schema for full-text search query parameters"""
+    q = fields.Str(required=True, validate=validate.Length(min=1, max=200))
+    type = fields.Str(validate=validate.OneOf(SEARCH_TYPES), load_default='all')
+    page = fields.Int(validate=validate.Range(min=1), load_default=1)
+    per_page = fields.Int(validate=validate.Range(min=1, max=50), load_default=10)
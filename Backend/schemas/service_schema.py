@@ -1,7 +1,12 @@
-from marshmallow import Schema, fields, validate, validates, ValidationError
-from datetime import datetime, timedelta
+from marshmallow import Schema, fields, validate, validates, validates_schema, ValidationError
+from marshmallow.utils import from_iso_datetime
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+import math
 import re
 
+_CENTS = Decimal('0.01')
+
 class ServiceCategorySchema(Schema):
     """Schema for service category"""
     id = fields.Int(dump_only=True)
@@ -40,7 +45,7 @@ class ServiceOfferSchema(Schema):
     id = fields.Int(dump_only=True)
     provider_id = fields.Int(dump_only=True)
     amount = fields.Decimal(required=True, places=2, as_string=True)
-    message = fields.Str(required=False, allow_none=True)
+    message = fields.Str(required=False, allow_none=True, validate=validate.Length(max=1000))
     status = fields.Str(dump_only=True)  # pending, accepted, rejected
     created_at = fields.DateTime(dump_only=True)
     updated_at = fields.DateTime(dump_only=True)
@@ -54,6 +59,20 @@ class ServiceOfferSchema(Schema):
         fields = ('id', 'provider_id', 'amount', 'message', 'status', 
                  'created_at', 'updated_at', 'provider')
         ordered = True
+    
+    @validates('amount')
+    def validate_amount(self, value):
+        if value <= 0:
+            raise ValidationError('Amount must be greater than 0')
+
+
+class ServiceOfferFilterSchema(Schema):
+    """Schema for listing the offers on a service"""
+    status = fields.Str(validate=validate.OneOf([
+            'pending', 'accepted', 'rejected', 'withdrawn'
+        ]), load_default='pending')
+    # Lowest amounts first, so this is the best-N cutoff
+    limit = fields.Int(validate=validate.Range(min=1, max=100), load_default=10)
 
 
 class ServiceMessageSchema(Schema):
@@ -72,6 +91,24 @@ class ServiceMessageSchema(Schema):
     class Meta:
         fields = ('id', 'message', 'is_read', 'created_at', 'sender_id', 'sender')
         ordered = True
+    
+    def fast_load(self, data):
+        """load() for the common {'message': str} payload; None defers to load()"""
+        if type(data) is not dict or len(data) != 1:
+            return None
+        message = data.get('message')
+        if type(message) is not str or not 1 <= len(message) <= 1000:
+            return None
+        return {'message': message}
+
+
+class ServiceMessageFilterSchema(Schema):
+    """Schema for fetching a window of service messages"""
+    after_id = fields.Int(validate=validate.Range(min=0))
+    before_id = fields.Int(validate=validate.Range(min=1))
+    limit = fields.Int(validate=validate.Range(min=1, max=100), load_default=50)
+    # Mark the returned messages from the other party as read
+    mark_read = fields.Bool(load_default=True)
 
 
 class ServiceCreateSchema(Schema):
@@ -80,11 +117,15 @@ class ServiceCreateSchema(Schema):
     description = fields.Str(required=True, validate=validate.Length(min=10, max=5000))
     category_id = fields.Int(required=True)
     budget = fields.Decimal(required=True, places=2, as_string=True)
-    deadline = fields.DateTime(required=True)
+    # Offsets are converted to naive UTC to match the database columns
+    deadline = fields.NaiveDateTime(required=True, timezone=timezone.utc)
     location = fields.Str(required=True)
     latitude = fields.Float(required=False, allow_none=True)
     longitude = fields.Float(required=False, allow_none=True)
     
+    REQUIRED_FIELDS = frozenset(('title', 'description', 'category_id', 'budget', 'deadline', 'location'))
+    ALL_FIELDS = REQUIRED_FIELDS | {'latitude', 'longitude'}
+    
     @validates('budget')
     def validate_budget(self, value):
         if value <= 0:
@@ -94,6 +135,67 @@ class ServiceCreateSchema(Schema):
     def validate_deadline(self, value):
         if value < datetime.utcnow() + timedelta(hours=1):
             raise ValidationError('Deadline must be at least 1 hour from now')
+    
+    def fast_load(self, data):
+        """
+        load() specialised for well-formed JSON payloads, producing the same
+        result without marshmallow's per-field dispatch. Anything unusual
+        (coercible strings, bad values, extra keys) returns None so load()
+        handles it and reports the errors.
+        """
+        if type(data) is not dict or not self.REQUIRED_FIELDS <= data.keys() <= self.ALL_FIELDS:
+            return None
+        
+        title, description, location = data['title'], data['description'], data['location']
+        if type(title) is not str or not 5 <= len(title) <= 200:
+            return None
+        if type(description) is not str or not 10 <= len(description) <= 5000:
+            return None
+        if type(location) is not str or type(data['category_id']) is not int:
+            return None
+        
+        budget = data['budget']
+        if type(budget) not in (int, float, str):
+            return None
+        try:
+            budget = Decimal(str(budget))
+            if not budget.is_finite():
+                return None
+            budget = budget.quantize(_CENTS)
+        except InvalidOperation:
+            return None
+        if budget <= 0:
+            return None
+        
+        deadline = data['deadline']
+        if type(deadline) is not str or not deadline:
+            return None
+        try:
+            deadline = from_iso_datetime(deadline)
+        except ValueError:
+            return None
+        if deadline.tzinfo is not None:
+            deadline = deadline.astimezone(timezone.utc).replace(tzinfo=None)
+        if deadline < datetime.utcnow() + timedelta(hours=1):
+            return None
+        
+        result = {
+            'title': title,
+            'description': description,
+            'category_id': data['category_id'],
+            'budget': budget,
+            'deadline': deadline,
+            'location': location
+        }
+        for name in ('latitude', 'longitude'):
+            if name in data:
+                value = data[name]
+                if value is not None:
+                    if type(value) not in (int, float) or not math.isfinite(value):
+                        return None
+                    value = float(value)
+                result[name] = value
+        return result
 
 
 class ServiceUpdateSchema(Schema):
@@ -104,7 +206,7 @@ class ServiceUpdateSchema(Schema):
         'pending', 'assigned', 'in_progress', 'completed', 'cancelled', 'rejected', 'expired'
     ]), required=False)
     budget = fields.Decimal(places=2, as_string=True, required=False)
-    deadline = fields.DateTime(required=False)
+    deadline = fields.NaiveDateTime(required=False, timezone=timezone.utc)
     location = fields.Str(required=False)
     latitude = fields.Float(required=False, allow_none=True)
     longitude = fields.Float(required=False, allow_none=True)
@@ -180,23 +282,44 @@ class ServiceFilterSchema(Schema):
             'all', 'pending', 'assigned', 'in_progress', 'completed', 'cancelled', 'rejected', 'expired'
         ]), load_default='all')
     category_id = fields.Int(required=False)
+    include_subcategories = fields.Bool(load_default=False)
     min_budget = fields.Decimal(places=2, as_string=True, required=False)
     max_budget = fields.Decimal(places=2, as_string=True, required=False)
     location = fields.Str(required=False)
-    latitude = fields.Float(required=False)
-    longitude = fields.Float(required=False)
+    latitude = fields.Float(required=False, validate=validate.Range(min=-90, max=90))
+    longitude = fields.Float(required=False, validate=validate.Range(min=-180, max=180))
     radius = fields.Int(required=False)  # in kilometers
+    # Defaults to 'distance' for radius searches and 'newest' otherwise
     sort_by = fields.Str(validate=validate.OneOf([
-            'newest', 'oldest', 'budget_high', 'budget_low', 'deadline_soonest'
-        ]), load_default='newest')
+            'newest', 'oldest', 'budget_high', 'budget_low', 'deadline_soonest', 'distance'
+        ]), load_default=None)
     page = fields.Int(validate=validate.Range(min=1), load_default=1)
-    per_page = fields.Int(validate=validate.Range(min=1, max=100), load_default=20)
+    per_page = fields.Int(validate=validate.Range(min=1, max=100), load_default=10)
+    
+    # Keyset pagination (opt-in by passing cursor, empty for the first page)
+    cursor = fields.Str(required=False)
+    include_total = fields.Bool(load_default=False)
+    
+    @validates_schema
+    def validate_budget_range(self, data, **kwargs):
+        min_budget = data.get('min_budget')
+        max_budget = data.get('max_budget')
+        if min_budget is not None and max_budget is not None and max_budget < min_budget:
+            raise ValidationError('max_budget must be greater than or equal to min_budget', 'max_budget')
+    
+    @validates_schema
+    def validate_coordinates(self, data, **kwargs):
+        if ('latitude' in data) != ('longitude' in data):
+            raise ValidationError('latitude and longitude must be provided together', 'latitude')
+        if 'radius' in data and 'latitude' not in data:
+            raise ValidationError('radius requires latitude and longitude', 'radius')
+        if data.get('sort_by') == 'distance' and 'latitude' not in data:
+            raise ValidationError('Sorting by distance requires latitude and longitude', 'sort_by')
     
-    @validates('max_budget')
-    def validate_budget_range(self, value, **kwargs):
-        if 'min_budget' in self.context and value is not None and self.context['min_budget'] is not None:
-            if value < self.context['min_budget']:
-                raise ValidationError('max_budget must be greater than or equal to min_budget')
+    @validates_schema
+    def validate_cursor_sort(self, data, **kwargs):
+        if 'cursor' in data and data.get('sort_by') not in (None, 'newest'):
+            raise ValidationError('Cursor pagination only supports newest-first ordering', 'sort_by')
     
     @validates('radius')
     def validate_radius(self, value, **kwargs):
@@ -206,7 +329,8 @@ class ServiceFilterSchema(Schema):
 
 class ServiceAssignmentSchema(Schema):
     """Schema for assigning a provider to a service"""
-    provider_id = fields.Int(required=True)
+    # Providers assign themselves, so the id is only meaningful for admin tooling
+    provider_id = fields.Int(required=False)
     message = fields.Str(required=False, allow_none=True)
 
 
@@ -0,0 +1,170 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from enum import Enum
+from sqlalchemy import Boolean, DateTime, Float, Integer, Numeric, func, select
+
+from extensions.extensions import db
+from models.notification import Notification
+from models.rating import Rating
+from models.service import Service, ServiceMessage
+from utils.streaming import STREAM_BATCH_SIZE, csv_chunks, ndjson_chunks
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - Parquet exports are optional
+    pa = pq = None
+
+EXPORT_FORMATS = ('ndjson', 'csv', 'parquet')
+
+EXPORT_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class _ChunkSink:
+    """Write-only file object handing back what was written since the last drain()"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ExportService:
+    """Bulk exports of marketplace tables for analytics"""
+
+    # Exportable tables; every one carries an updated_at watermark
+    DATASETS = {
+        'services': Service,
+        'ratings': Rating,
+        'service_messages': ServiceMessage,
+        'notifications': Notification,
+    }
+
+    @staticmethod
+    @contextmanager
+    def snapshot():
+        """
+        A connection whose reads all see one consistent snapshot of the
+        database, so several datasets can be exported without tearing.
+        """
+        with db.engine.connect() as connection:
+            if connection.dialect.name == 'sqlite':
+                # pysqlite only opens a transaction ahead of writes
+                if not connection.connection.driver_connection.in_transaction:
+                    connection.exec_driver_sql('BEGIN')
+            else:
+                connection.execution_options(isolation_level='REPEATABLE READ')
+            try:
+                yield connection
+            finally:
+                connection.rollback()
+
+    @classmethod
+    def export(cls, connection, dataset, fmt, since=None, overlap=timedelta(0)):
+        """
+        Export rows of dataset changed after since (all rows if None).
+
+        Returns (watermark, chunks): watermark is the newest updated_at in the
+        snapshot, to pass as since on the next incremental run, and chunks is
+        a generator of encoded str (ndjson, csv) or bytes (parquet) pieces.
+        Rows are read through a server-side cursor STREAM_BATCH_SIZE at a time.
+
+        updated_at is stamped when a row is flushed, not when it commits, so
+        a row committed after the previous snapshot may carry an older time
+        than its watermark. Incremental runs therefore also return the rows
+        updated within overlap before since; consumers load rows by id.
+        """
+        if fmt == 'parquet' and pa is None:
+            raise ValueError('Parquet exports require pyarrow')
+        table = cls.DATASETS[dataset].__table__
+
+        watermark = connection.execute(select(func.max(table.c.updated_at))).scalar()
+        query = select(table).order_by(table.c.updated_at, table.c.id)
+        if since is not None:
+            query = query.where(table.c.updated_at > since - overlap)
+            if watermark is not None:
+                query = query.where(table.c.updated_at <= watermark)
+
+        def rows():
+            result = connection.execute(
+                query.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+            )
+            for partition in result.mappings().partitions():
+                yield from partition
+
+        if fmt == 'parquet':
+            chunks = cls._parquet_chunks(table, rows())
+        elif fmt == 'csv':
+            chunks = csv_chunks(rows(), [column.name for column in table.columns], cls._flatten)
+        else:
+            chunks = ndjson_chunks(rows(), cls._flatten)
+        return watermark, chunks
+
+    @staticmethod
+    def _flatten(row):
+        """Plain values for text formats: enums by value, datetimes in ISO 8601"""
+        data = {}
+        for key, value in row.items():
+            if isinstance(value, Enum):
+                value = value.value
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            data[key] = value
+        return data
+
+    @staticmethod
+    def _arrow_type(column_type):
+        if isinstance(column_type, Boolean):
+            return pa.bool_()
+        if isinstance(column_type, Integer):
+            return pa.int64()
+        if isinstance(column_type, Float):
+            return pa.float64()
+        if isinstance(column_type, Numeric):
+            return pa.decimal128(column_type.precision or 38, column_type.scale or 0)
+        if isinstance(column_type, DateTime):
+            return pa.timestamp('us')
+        return pa.string()
+
+    @classmethod
+    def _parquet_chunks(cls, table, rows):
+        """Encode rows as Parquet, one row group per STREAM_BATCH_SIZE rows"""
+        schema = pa.schema([(column.name, cls._arrow_type(column.type)) for column in table.columns])
+        sink = _ChunkSink()
+        batch = []
+        with pq.ParquetWriter(sink, schema) as writer:
+            for row in rows:
+                batch.append({
+                    key: value.value if isinstance(value, Enum) else value
+                    for key, value in row.items()
+                })
+                if len(batch) >= STREAM_BATCH_SIZE:
+                    writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+                    batch = []
+                    yield sink.drain()
+            if batch:
+                writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+        yield sink.drain()
@@ -0,0 +1,210 @@
+import math
+import threading
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+
+from extensions.extensions import db
+from models.service import Service, ServiceStatus
+from models.user import User, UserProfile, UserRole
+from utils.geo import KM_PER_DEGREE, bounding_box, haversine_km
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# What the grid keeps per provider: the service area and the opening days
+ProviderArea = namedtuple('ProviderArea', ['latitude', 'longitude', 'radius_km', 'open_days', 'cells'])
+
+
+def open_days(business_hours):
+    """
+    Weekday indexes (0 is Monday) on which business_hours has the provider
+    open, or None when no hours are set, meaning any day.
+    """
+    if not business_hours:
+        return None
+    return frozenset(
+        index for index, day in enumerate(WEEKDAYS)
+        if isinstance(business_hours.get(day), dict)
+        and business_hours[day].get('open') and business_hours[day].get('close')
+    )
+
+
+class ProviderGrid:
+    """
+    In-memory spatial index of provider service areas.
+
+    The map is cut into square cells of cell_km and each provider is filed
+    under every cell its service circle overlaps, so the providers who might
+    cover a point are those in the point's one cell. Looking up a service
+    thus costs the providers near it, not every provider. It is not
+    thread-safe; MatchingService guards it with its lock.
+    """
+
+    def __init__(self, cell_km=10.0, max_radius_km=100):
+        self.cell_degrees = cell_km / KM_PER_DEGREE
+        self.max_radius_km = max_radius_km
+        self._cells = defaultdict(set)
+        self._providers = {}
+
+    def __len__(self):
+        return len(self._providers)
+
+    def _cell(self, latitude, longitude):
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def _covered_cells(self, latitude, longitude, radius_km):
+        min_lat, max_lat, lng_ranges = bounding_box(latitude, longitude, radius_km)
+        cells = []
+        for min_lng, max_lng in lng_ranges:
+            low_row, low_col = self._cell(min_lat, min_lng)
+            high_row, high_col = self._cell(max_lat, max_lng)
+            cells.extend(
+                (row, col)
+                for row in range(low_row, high_row + 1)
+                for col in range(low_col, high_col + 1)
+            )
+        return cells
+
+    def upsert(self, provider_id, latitude, longitude, radius_km, business_hours):
+        """File (or re-file) a provider; one without coordinates is dropped"""
+        self.remove(provider_id)
+        if latitude is None or longitude is None:
+            return
+        radius_km = min(radius_km or 0, self.max_radius_km)
+        cells = self._covered_cells(latitude, longitude, radius_km)
+        for cell in cells:
+            self._cells[cell].add(provider_id)
+        self._providers[provider_id] = ProviderArea(latitude, longitude, radius_km, open_days(business_hours), cells)
+
+    def remove(self, provider_id):
+        area = self._providers.pop(provider_id, None)
+        if area is None:
+            return
+        for cell in area.cells:
+            members = self._cells[cell]
+            members.discard(provider_id)
+            if not members:
+                del self._cells[cell]
+
+    def clear(self):
+        self._cells.clear()
+        self._providers.clear()
+
+    def covering(self, latitude, longitude, weekdays=None):
+        """
+        Providers whose service area contains the point, as {id: distance_km},
+        keeping only those open on one of weekdays when it is given.
+        """
+        matches = {}
+        for provider_id in self._cells.get(self._cell(latitude, longitude), ()):
+            area = self._providers[provider_id]
+            if weekdays is not None and area.open_days is not None and not (area.open_days & weekdays):
+                continue
+            distance = haversine_km(latitude, longitude, area.latitude, area.longitude)
+            if distance <= area.radius_km:
+                matches[provider_id] = distance
+        return matches
+
+
+class MatchingService:
+    """Finds the providers to tell about a newly posted service"""
+
+    _grid = None
+    _watermark = None
+    _built_at = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _provider_rows(cls, *criteria):
+        return db.session.query(
+            User.id, User.is_active, UserProfile.latitude, UserProfile.longitude,
+            UserProfile.service_radius, UserProfile.business_hours
+        ).outerjoin(UserProfile, UserProfile.user_id == User.id).filter(
+            User.role == UserRole.PROVIDER, *criteria
+        )
+
+    @classmethod
+    def _file(cls, grid, rows):
+        for row in rows:
+            if row.is_active:
+                grid.upsert(row.id, row.latitude, row.longitude, row.service_radius, row.business_hours)
+            else:
+                grid.remove(row.id)
+
+    @classmethod
+    def refresh(cls):
+        """
+        Bring the process-wide grid up to date and return it.
+
+        The first call (and every MATCHING_GRID_REBUILD_INTERVAL seconds, to
+        pick up deleted rows) loads every provider; in between, only users
+        and profiles updated since the last refresh are re-filed, each found
+        through its updated_at index.
+        """
+        config = current_app.config
+        now = datetime.utcnow()
+        with cls._lock:
+            rebuild_interval = timedelta(seconds=config.get('MATCHING_GRID_REBUILD_INTERVAL', 3600))
+            if cls._grid is None or now - cls._built_at >= rebuild_interval:
+                grid = ProviderGrid(config.get('MATCHING_GRID_CELL_KM', 10.0),
+                                    config.get('MATCHING_MAX_RADIUS_KM', 100))
+                cls._file(grid, cls._provider_rows())
+                cls._grid, cls._built_at = grid, now
+            else:
+                changed = {user_id for user_id, in db.session.query(User.id).filter(
+                    User.updated_at >= cls._watermark)}
+                changed.update(user_id for user_id, in db.session.query(UserProfile.user_id).filter(
+                    UserProfile.updated_at >= cls._watermark))
+                if changed:
+                    rows = cls._provider_rows(User.id.in_(changed)).all()
+                    cls._file(cls._grid, rows)
+                    # Users who are no longer providers
+                    for user_id in changed - {row.id for row in rows}:
+                        cls._grid.remove(user_id)
+            # Look back a little next time for rows whose transactions were
+            # still open now; filing a provider twice is harmless
+            cls._watermark = now - timedelta(seconds=config.get('MATCHING_GRID_REFRESH_OVERLAP', 60))
+            return cls._grid
+
+    @classmethod
+    def reset(cls):
+        """Drop the grid so the next refresh rebuilds it"""
+        with cls._lock:
+            cls._grid = cls._watermark = cls._built_at = None
+
+    @staticmethod
+    def weekdays_until(deadline, now=None):
+        """Weekday indexes from today up to the deadline (at most a week's worth)"""
+        today = (now or datetime.utcnow()).date()
+        days = max(0, min(((deadline.date() if deadline else today) - today).days, 6))
+        return frozenset((today + timedelta(days=offset)).weekday() for offset in range(days + 1))
+
+    @classmethod
+    def match(cls, service, limit=None):
+        """
+        Provider ids eligible for a pending service: within their service
+        radius of it, open on some day before its deadline, and not its
+        client. Providers who completed services in its category come first,
+        then the nearest; at most limit (MATCHING_NOTIFY_LIMIT) are returned.
+        """
+        if service.status != ServiceStatus.PENDING or service.latitude is None or service.longitude is None:
+            return []
+        limit = limit or current_app.config.get('MATCHING_NOTIFY_LIMIT', 50)
+
+        grid = cls.refresh()
+        # Another request's refresh may be re-filing providers meanwhile
+        with cls._lock:
+            matches = grid.covering(service.latitude, service.longitude,
+                                    cls.weekdays_until(service.deadline))
+        matches.pop(service.client_id, None)
+        if not matches:
+            return []
+
+        history = dict(db.session.query(Service.provider_id, func.count(Service.id)).filter(
+            Service.provider_id.in_(matches),
+            Service.status == ServiceStatus.COMPLETED,
+            Service.category_id == service.category_id
+        ).group_by(Service.provider_id).all())
+        ranked = sorted(matches, key=lambda provider_id: (-history.get(provider_id, 0), matches[provider_id]))
+        return ranked[:limit]
@@ -0,0 +1 @@
+# This file makes the tasks directory a Python package
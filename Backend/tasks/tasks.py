@@ -0,0 +1,332 @@
+"""
+Celery tasks for work that must stay off the request path.
+
+Routes only enqueue; under TestingConfig (CELERY_TASK_ALWAYS_EAGER) the
+tasks run inline so the whole pipeline is exercised synchronously.
+"""
+import json
+import logging
+from datetime import datetime
+from itertools import groupby
+from uuid import uuid4
+from flask import current_app
+from flask_mail import Message
+from kombu.exceptions import OperationalError
+
+from extensions.extensions import cache, celery, db
+from models.notification import Notification, NotificationPreference, NotificationType, PushSubscription
+from models.service import Service
+from services.matching_service import MatchingService
+from models.user import User
+from utils.email import ReconnectingConnection, deliver_bulk_email, render_bulk
+
+logger = logging.getLogger(__name__)
+
+def enqueue(task, *args, **kwargs):
+    """
+    Queue a task without letting a broker outage fail the caller.
+
+    For work triggered after a commit (notifications, matching): the state
+    change has already happened, so a broker error is logged rather than
+    turned into an error response. Returns the AsyncResult, or None if the
+    task could not be queued.
+    """
+    try:
+        return task.delay(*args, **kwargs)
+    except (OperationalError, OSError) as e:
+        logger.error(f"Could not queue {task.name}: {str(e)}")
+        return None
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _deliver(entries):
+    """
+    Create notifications from dicts of Notification columns, keeping only
+    those each recipient's NotificationPreference allows, and fan them out
+    to email and web push. Returns the ids of the notifications created.
+    """
+    preferences = NotificationPreference.for_users(list(dict.fromkeys(entry['user_id'] for entry in entries)))
+    notifications = [
+        Notification(**entry)
+        for entry in entries
+        if preferences[entry['user_id']].allows(entry['notification_type'])
+    ]
+    if not notifications:
+        return []
+    db.session.add_all(notifications)
+    db.session.commit()
+    
+    email_ids = [n.id for n in notifications if preferences[n.user_id].wants_immediate_email()]
+    push_ids = [n.id for n in notifications if preferences[n.user_id].wants_push()]
+    
+    batch_size = current_app.config.get('NOTIFICATION_BATCH_SIZE', 100)
+    for batch in _batches(email_ids, batch_size):
+        send_notification_emails.delay(batch)
+    for batch in _batches(push_ids, batch_size):
+        send_push_notifications.delay(batch)
+    
+    return [n.id for n in notifications]
+
+@celery.task(name='notifications.dispatch')
+def dispatch_notification(user_ids, notification_type, title, message,
+                          related_entity_type=None, related_entity_id=None):
+    """
+    Create notifications for the given users and fan them out to email and
+    web push according to each user's NotificationPreference.
+
+    Returns the ids of the notifications created.
+    """
+    notification_type = NotificationType(notification_type)
+    return _deliver([
+        {
+            'user_id': user_id,
+            'title': title,
+            'message': message,
+            'notification_type': notification_type,
+            'related_entity_type': related_entity_type,
+            'related_entity_id': related_entity_id
+        }
+        for user_id in dict.fromkeys(user_ids)
+    ])
+
+@celery.task(name='notifications.dispatch_many')
+def dispatch_notifications(entries):
+    """
+    Like dispatch_notification, for notifications that differ per recipient:
+    entries are dicts with user_id, notification_type, title, message and
+    optionally related_entity_type and related_entity_id.
+    """
+    return _deliver([
+        dict(entry, notification_type=NotificationType(entry['notification_type']))
+        for entry in entries
+    ])
+
+@celery.task(name='notifications.send_emails')
+def send_notification_emails(notification_ids):
+    """Email a batch of notifications, reusing one SMTP connection until a send fails"""
+    rows = db.session.query(Notification, User).join(User, User.id == Notification.user_id).filter(
+        Notification.id.in_(notification_ids)
+    ).all()
+    if not rows:
+        return 0
+    
+    frontend_url = current_app.config.get('FRONTEND_URL', '')
+    contexts = []
+    for notification, user in rows:
+        action_url = None
+        if notification.related_entity_type == 'service' and notification.related_entity_id:
+            action_url = f"{frontend_url}/services/{notification.related_entity_id}"
+        contexts.append({'notification': notification, 'user': user, 'action_url': action_url})
+    
+    sent = 0
+    with ReconnectingConnection() as connection:
+        for (notification, user), (html_body, text_body) in zip(rows, render_bulk('notification', contexts)):
+            try:
+                connection.send(Message(
+                    subject=notification.title,
+                    sender=current_app.config['MAIL_DEFAULT_SENDER'],
+                    recipients=[user.email],
+                    html=html_body,
+                    body=text_body
+                ))
+                sent += 1
+            except Exception as e:
+                current_app.logger.error(f"Failed to email notification {notification.id}: {str(e)}")
+    return sent
+
+@celery.task(name='notifications.send_push')
+def send_push_notifications(notification_ids):
+    """Deliver a batch of notifications to every active web push subscription"""
+    vapid_private_key = current_app.config.get('VAPID_PRIVATE_KEY')
+    if not vapid_private_key:
+        logger.info("VAPID_PRIVATE_KEY not configured; skipping web push")
+        return 0
+    try:
+        from pywebpush import webpush, WebPushException
+    except ImportError:
+        logger.warning("pywebpush is not installed; skipping web push")
+        return 0
+    
+    notifications = Notification.query.filter(Notification.id.in_(notification_ids)).all()
+    user_ids = {n.user_id for n in notifications}
+    subscriptions = {}
+    for subscription in PushSubscription.query.filter(
+        PushSubscription.user_id.in_(user_ids),
+        PushSubscription.is_active.is_(True)
+    ).all():
+        subscriptions.setdefault(subscription.user_id, []).append(subscription)
+    
+    vapid_claims = {'sub': f"mailto:{current_app.config.get('VAPID_CLAIMS_EMAIL') or current_app.config['MAIL_DEFAULT_SENDER']}"}
+    sent = 0
+    expired = []
+    for notification in notifications:
+        payload = json.dumps(notification.to_dict())
+        for subscription in subscriptions.get(notification.user_id, []):
+            try:
+                webpush(
+                    subscription_info={
+                        'endpoint': subscription.endpoint,
+                        'keys': {'auth': subscription.auth, 'p256dh': subscription.p256dh}
+                    },
+                    data=payload,
+                    vapid_private_key=vapid_private_key,
+                    vapid_claims=dict(vapid_claims)
+                )
+                sent += 1
+            except WebPushException as e:
+                # 404/410 mean the browser dropped the subscription
+                if e.response is not None and e.response.status_code in (404, 410):
+                    expired.append(subscription.id)
+                else:
+                    logger.warning(f"Web push to subscription {subscription.id} failed: {str(e)}")
+    
+    if expired:
+        PushSubscription.query.filter(PushSubscription.id.in_(expired)).update(
+            {'is_active': False}, synchronize_session=False
+        )
+        db.session.commit()
+    return sent
+
+@celery.task(name='notifications.reconcile_unread_counts')
+def reconcile_unread_counts():
+    """Periodic repair of the cached unread counters"""
+    return Notification.reconcile_unread_counts()
+
+def _digest_context(frequency, user, notifications, frontend_url):
+    """Template context for one user's digest, notifications grouped by type"""
+    sections = {}
+    for notification in notifications:
+        sections.setdefault(notification.notification_type, []).append(notification)
+    return {
+        'recipients': [user.email],
+        'subject': f"Your {frequency} summary: {len(notifications)} new notification{'s' if len(notifications) != 1 else ''}",
+        'user': user,
+        'frequency': frequency,
+        'total': len(notifications),
+        'sections': [
+            (notification_type.value.replace('_', ' ').capitalize(), items)
+            for notification_type, items in sections.items()
+        ],
+        'notifications_url': f"{frontend_url}/notifications"
+    }
+
+@celery.task(name='notifications.send_digests')
+def send_notification_digests(frequency):
+    """
+    Email one grouped digest per user whose email_frequency is 'daily' or
+    'weekly', covering everything since their previous digest.
+    
+    Users are taken DIGEST_BATCH_SIZE at a time; each batch is one ordered
+    range scan over notifications, sent over one SMTP connection, and only
+    then are the users' last_digest_at watermarks committed. A user whose
+    digest failed to send keeps their watermark, so the next run retries
+    them. Returns the number of digests sent.
+    """
+    if frequency not in NotificationPreference.DIGEST_PERIODS:
+        raise ValueError(f"Unknown digest frequency: {frequency}")
+    
+    cutoff = datetime.utcnow()
+    batch_size = current_app.config.get('DIGEST_BATCH_SIZE', 500)
+    frontend_url = current_app.config.get('FRONTEND_URL', '')
+    user_ids = [user_id for user_id, in db.session.query(NotificationPreference.user_id).filter(
+        NotificationPreference.email_frequency == frequency,
+        NotificationPreference.email_enabled.is_(True)
+    ).order_by(NotificationPreference.user_id)]
+    
+    sent = 0
+    for batch in _batches(user_ids, batch_size):
+        rows = Notification.digest_query(frequency, cutoff).add_entity(User).join(
+            User, User.id == Notification.user_id
+        ).filter(Notification.user_id.in_(batch)).all()
+        
+        contexts = []
+        context_users = []
+        for user_id, user_rows in groupby(rows, key=lambda row: row[0].user_id):
+            user_rows = list(user_rows)
+            _, preference, user = user_rows[0]
+            notifications = [n for n, _, _ in user_rows if preference.allows(n.notification_type)]
+            if notifications:
+                contexts.append(_digest_context(frequency, user, notifications, frontend_url))
+                context_users.append(user_id)
+        
+        failed = set(context_users)
+        if contexts:
+            delivered = deliver_bulk_email('digest', contexts, asynchronous=False)
+            failed.difference_update(context_users[index] for index in delivered)
+            sent += len(delivered)
+        # Users whose digest failed keep their watermark, so the next run
+        # covers the same notifications again
+        advance = [user_id for user_id in batch if user_id not in failed]
+        if advance:
+            NotificationPreference.query.filter(NotificationPreference.user_id.in_(advance)).update(
+                {'last_digest_at': cutoff}, synchronize_session=False
+            )
+        db.session.commit()
+    
+    return sent
+
+@celery.task(name='services.match_providers')
+def match_providers(service_id):
+    """
+    Tell the providers who could take a newly posted service about it.
+    Returns the ids of the providers notified.
+    """
+    service = db.session.get(Service, service_id)
+    if service is None:
+        return []
+    provider_ids = MatchingService.match(service)
+    if provider_ids:
+        dispatch_notification.delay(
+            provider_ids,
+            NotificationType.SERVICE_REQUESTED.value,
+            'New service request near you',
+            f"'{service.title}' was posted within your service area",
+            'service',
+            service.id
+        )
+    return provider_ids
+
+@celery.task(name='services.expire_overdue')
+def expire_overdue_services():
+    """
+    Expire pending services whose deadline has passed and tell their clients.
+    
+    Runs SERVICE_EXPIRY_BATCH_SIZE services per UPDATE and commit, and one
+    notification task per batch. A cache lock keeps overlapping beat runs
+    on different workers from doing the same work; it times out on its own
+    if the holder dies. Returns the number of services expired.
+    """
+    lock_key = 'lock:services.expire_overdue'
+    token = uuid4().hex
+    if not cache.add(lock_key, token, timeout=current_app.config.get('SERVICE_EXPIRY_LOCK_TIMEOUT', 600)):
+        logger.info("Service expiry is already running elsewhere; skipping")
+        return 0
+    
+    try:
+        cutoff = datetime.utcnow()
+        batch_size = current_app.config.get('SERVICE_EXPIRY_BATCH_SIZE', 500)
+        expired = 0
+        while True:
+            rows = Service.expire_overdue(now=cutoff, batch_size=batch_size)
+            db.session.commit()
+            if rows:
+                dispatch_notifications.delay([
+                    {
+                        'user_id': row.client_id,
+                        'notification_type': NotificationType.SERVICE_EXPIRED.value,
+                        'title': 'Service request expired',
+                        'message': f"'{row.title}' passed its deadline without being assigned",
+                        'related_entity_type': 'service',
+                        'related_entity_id': row.id
+                    }
+                    for row in rows
+                ])
+            expired += len(rows)
+            if len(rows) < batch_size:
+                break
+        return expired
+    finally:
+        # Only release a lock that is still ours, not one taken after ours timed out
+        cache.delete_if_equals(lock_key, token)
@@ -0,0 +1,260 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+class MemoryCache:
+    """
+    In-process LRU cache backend, used for tests and single-process
+    development. Holds at most max_entries keys, evicting the least
+    recently used.
+    """
+
+    def __init__(self, max_entries=10000):
+        self._data = OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry
+
+    def _store(self, key, value, expires_at):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self._max_entries:
+            self._data.popitem(last=False)
+
+    @staticmethod
+    def _expiry(timeout):
+        return time.monotonic() + timeout if timeout else None
+
+    def get(self, key):
+        with self._lock:
+            entry = self._live(key)
+            return entry[0] if entry else None
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._store(key, value, self._expiry(timeout))
+        return True
+
+    def add(self, key, value, timeout=None):
+        """Set key only if it does not exist yet; returns whether it was set"""
+        with self._lock:
+            if self._live(key):
+                return False
+            self._store(key, value, self._expiry(timeout))
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def delete_if_equals(self, key, value):
+        """Delete key only if it still holds value; returns whether it was deleted"""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None or entry[0] != value:
+                return False
+            del self._data[key]
+            return True
+
+    def incr(self, key, delta=1):
+        """Atomically add delta to an existing integer; returns None if key is missing"""
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            value = entry[0] + delta
+            self._store(key, value, entry[1])
+            return value
+
+    def keys(self, prefix=''):
+        with self._lock:
+            return [key for key in list(self._data) if key.startswith(prefix) and self._live(key)]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class RedisCache:
+    """Redis cache backend, shared by every worker process"""
+
+    # INCRBY only when the key exists, so a missing counter is never
+    # silently recreated from zero
+    _INCR_IF_EXISTS = """
+    if redis.call('EXISTS', KEYS[1]) == 1 then
+        return redis.call('INCRBY', KEYS[1], ARGV[1])
+    end
+    return nil
+    """
+
+    # DEL only while the key still holds the expected value, e.g. a lock
+    # token, so a lock taken over by someone else after expiring is kept
+    _DELETE_IF_EQUALS = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url, prefix='mfua:'):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+        self._incr_if_exists = self._client.register_script(self._INCR_IF_EXISTS)
+        self._delete_if_equals = self._client.register_script(self._DELETE_IF_EQUALS)
+
+    def _key(self, key):
+        return f'{self._prefix}{key}'
+
+    def get(self, key):
+        value = self._client.get(self._key(key))
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, timeout=None):
+        return bool(self._client.set(self._key(key), json.dumps(value), ex=timeout or None))
+
+    def add(self, key, value, timeout=None):
+        return bool(self._client.set(self._key(key), json.dumps(value), ex=timeout or None, nx=True))
+
+    def delete(self, key):
+        return bool(self._client.delete(self._key(key)))
+
+    def delete_if_equals(self, key, value):
+        return bool(self._delete_if_equals(keys=[self._key(key)], args=[json.dumps(value)]))
+
+    def incr(self, key, delta=1):
+        return self._incr_if_exists(keys=[self._key(key)], args=[delta])
+
+    def keys(self, prefix=''):
+        start = len(self._prefix)
+        return [key.decode()[start:] for key in self._client.scan_iter(match=self._key(f'{prefix}*'))]
+
+    def clear(self):
+        keys = list(self._client.scan_iter(match=self._key('*')))
+        if keys:
+            self._client.delete(*keys)
+
+
+class Cache:
+    """
+    Flask extension wrapping the configured cache backend.
+
+    CACHE_BACKEND selects 'redis' (using REDIS_URL) or 'memory'. The cache is
+    best-effort: backend errors are logged and reported as a miss so callers
+    can fall back to the database.
+
+    Entries can be grouped under tags: each tag has a version number that is
+    folded into the keys of the entries depending on it, so bumping the tag
+    orphans all of them at once (they then age out via their timeout).
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._stats_lock = threading.Lock()
+        event.listen(Session, 'after_commit', self._bump_pending_tags)
+        event.listen(Session, 'after_rollback', self._discard_pending_tags)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config.get('CACHE_BACKEND', 'redis') == 'memory':
+            self.backend = MemoryCache(max_entries=app.config.get('CACHE_MAX_ENTRIES', 10000))
+        else:
+            self.backend = RedisCache(app.config['REDIS_URL'], prefix=app.config.get('CACHE_KEY_PREFIX', 'mfua:'))
+        app.extensions['cache'] = self
+
+    def _call(self, method, *args, default=None, **kwargs):
+        try:
+            return getattr(self.backend, method)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Cache {method} failed: {str(e)}")
+            return default
+
+    def get(self, key):
+        return self._call('get', key)
+
+    def set(self, key, value, timeout=None):
+        return self._call('set', key, value, timeout=timeout, default=False)
+
+    def add(self, key, value, timeout=None):
+        return self._call('add', key, value, timeout=timeout, default=False)
+
+    def delete(self, key):
+        return self._call('delete', key, default=False)
+
+    def delete_if_equals(self, key, value):
+        """Atomically delete key if it holds value, e.g. to release a lock only its owner holds"""
+        return self._call('delete_if_equals', key, value, default=False)
+
+    def incr(self, key, delta=1):
+        return self._call('incr', key, delta)
+
+    def keys(self, prefix=''):
+        return self._call('keys', prefix, default=[])
+
+    def clear(self):
+        return self._call('clear')
+
+    @staticmethod
+    def _tag_key(tag):
+        return f'tag:{tag}'
+
+    def tag_versions(self, tags):
+        """Current version of each tag, creating missing ones"""
+        versions = []
+        for tag in tags:
+            key = self._tag_key(tag)
+            version = self.get(key)
+            if version is None:
+                # Start from the clock so a tag lost to eviction or a flush
+                # never comes back at a version older entries were keyed on
+                self.add(key, time.time_ns() // 1000)
+                version = self.get(key)
+            versions.append(version)
+        return versions
+
+    def bump_tags(self, tags):
+        """Invalidate every entry stored under any of the tags"""
+        for tag in tags:
+            if self.incr(self._tag_key(tag)) is None:
+                self.set(self._tag_key(tag), time.time_ns() // 1000)
+
+    def bump_tags_after_commit(self, session, *tags):
+        """Bump tags once the surrounding transaction commits"""
+        session.info.setdefault('cache_tags', set()).update(tags)
+
+    def _bump_pending_tags(self, session):
+        tags = session.info.pop('cache_tags', None)
+        if tags and self.backend is not None:
+            self.bump_tags(tags)
+
+    def _discard_pending_tags(self, session):
+        session.info.pop('cache_tags', None)
+
+    def record(self, name, hit):
+        """Count a hit or miss for the named cached resource"""
+        with self._stats_lock:
+            self._stats[name]['hits' if hit else 'misses'] += 1
+
+    def stats(self):
+        """Hit and miss counters of this process, per cached resource"""
+        with self._stats_lock:
+            return {name: dict(counts) for name, counts in self._stats.items()}
@@ -1,26 +1,41 @@
+import hashlib
 from functools import wraps
-from flask import request, jsonify
+from urllib.parse import urlencode
+from flask import Response, current_app, request, jsonify
 from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from marshmallow import ValidationError
 
+from extensions.extensions import cache
 from models.user import UserRole
 
-def validate_schema(schema_cls):
+def validate_schema(schema, partial=False):
     """
-    Validate request data against a Marshmallow schema.
-    Returns 400 with validation errors if validation fails.
+    Load the JSON body with a Marshmallow schema (class or instance, built
+    once here) and pass the typed result to the view as the `data` keyword
+    argument. Returns 400 with the validation errors if loading fails.
+    
+    Schemas may define fast_load(payload), a hand-compiled check of the
+    common valid payload; it returns the loaded dict, or None to fall back
+    to the full load() (which also produces the error messages).
     """
+    if isinstance(schema, type):
+        schema = schema()
+    fast_load = None if partial else getattr(schema, 'fast_load', None)
+    
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            data = request.get_json()
-            schema = schema_cls()
-            errors = schema.validate(data)
-            if errors:
-                return jsonify({
-                    'message': 'Validation error',
-                    'errors': errors
-                }), 400
-            return f(*args, **kwargs)
+            payload = request.get_json()
+            data = fast_load(payload) if fast_load else None
+            if data is None:
+                try:
+                    data = schema.load(payload, partial=partial)
+                except ValidationError as err:
+                    return jsonify({
+                        'message': 'Validation error',
+                        'errors': err.messages
+                    }), 400
+            return f(*args, data=data, **kwargs)
         return decorated_function
     return decorator
 
@@ -67,3 +82,39 @@ def admin_required(f):
             }), 403
         return f(*args, **kwargs)
     return decorated_function
+
+def cached_response(*tags, timeout=None):
+    """
+    Cache successful responses of a public GET view.
+    
+    The key is built from the endpoint, path and sorted query arguments plus
+    the current version of each tag, so model writes that bump a tag (see
+    Cache.bump_tags_after_commit) invalidate every response depending on it.
+    Only for views whose output does not depend on the caller. Responses
+    carry an X-Cache: HIT/MISS header.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            query = urlencode(sorted(request.args.items(multi=True)))
+            digest = hashlib.sha1(f'{request.path}?{query}'.encode()).hexdigest()
+            versions = '.'.join(str(version) for version in cache.tag_versions(tags))
+            key = f'response:{request.endpoint}:{digest}:{versions}'
+            
+            entry = cache.get(key)
+            cache.record(request.endpoint, hit=entry is not None)
+            if entry is not None:
+                response = Response(entry['body'], status=200, mimetype=entry['mimetype'])
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                cache.set(key, {
+                    'body': response.get_data(as_text=True),
+                    'mimetype': response.mimetype
+                }, timeout=timeout or current_app.config.get('RESPONSE_CACHE_TIMEOUT', 300))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorated_function
+    return decorator
@@ -1,16 +1,186 @@
-import os
+import atexit
+import logging
+import queue
+import threading
+import time
 from flask import current_app, render_template
 from flask_mail import Message
-from threading import Thread
 from extensions.extensions import mail
 
-def send_async_email(app, msg):
-    """Helper function to send email asynchronously"""
-    with app.app_context():
+logger = logging.getLogger(__name__)
+_pool_lock = threading.Lock()
+
+class EmailWorkerPool:
+    """
+    Fixed pool of threads draining a bounded queue of messages.
+
+    Each worker keeps one SMTP connection open through mail.connect() and
+    reuses it for every message until it fails or sits idle, instead of
+    paying a handshake per email. When the queue is full submit() waits
+    MAIL_ENQUEUE_TIMEOUT seconds and then rejects the message, so a burst
+    cannot grow memory or thread count without bound.
+    """
+
+    _STOP = object()
+
+    def __init__(self, app, workers=2, queue_size=1000, enqueue_timeout=1.0,
+                 max_retries=3, retry_backoff=1.0, idle_timeout=30):
+        self.app = app
+        self.workers = workers
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._counters = {'queued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'rejected': 0, 'connections': 0}
+
+    @classmethod
+    def from_app(cls, app):
+        config = app.config
+        return cls(
+            app,
+            workers=config.get('MAIL_WORKERS', 2),
+            queue_size=config.get('MAIL_QUEUE_SIZE', 1000),
+            enqueue_timeout=config.get('MAIL_ENQUEUE_TIMEOUT', 1.0),
+            max_retries=config.get('MAIL_MAX_RETRIES', 3),
+            retry_backoff=config.get('MAIL_RETRY_BACKOFF', 1.0),
+            idle_timeout=config.get('MAIL_CONNECTION_IDLE_TIMEOUT', 30)
+        )
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'email-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, msg):
+        """Queue a message for delivery; returns False if the queue stayed full"""
+        self.start()
         try:
-            mail.send(msg)
-        except Exception as e:
-            current_app.logger.error(f"Error sending email: {str(e)}")
+            self._queue.put(msg, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count('rejected')
+            return False
+        self._count('queued')
+        return True
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._counters)
+        metrics.update(workers=len(self._threads), backlog=self._queue.qsize(), capacity=self._queue.maxsize)
+        return metrics
+
+    def shutdown(self, timeout=10):
+        """Let the workers finish the backlog, then close their connections"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(self._STOP)
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+
+    def _open(self):
+        connection = mail.connect()
+        connection.__enter__()
+        self._count('connections')
+        return connection
+
+    @staticmethod
+    def _close(connection):
+        if connection is None:
+            return
+        try:
+            connection.__exit__(None, None, None)
+        except Exception:
+            # The server may already have dropped us
+            pass
+
+    def _deliver(self, connection, msg):
+        """Send msg, reconnecting with exponential backoff; returns the connection to keep"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                if connection is None:
+                    connection = self._open()
+                connection.send(msg)
+                self._count('sent')
+                return connection
+            except Exception as e:
+                self._close(connection)
+                connection = None
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    logger.error(f"Error sending email to {msg.recipients}: {str(e)}")
+                    return None
+                self._count('retried')
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    def _work(self):
+        with self.app.app_context():
+            connection = None
+            while True:
+                try:
+                    msg = self._queue.get(timeout=self.idle_timeout)
+                except queue.Empty:
+                    # Don't hold an idle connection the server will time out anyway
+                    self._close(connection)
+                    connection = None
+                    continue
+                try:
+                    if msg is self._STOP:
+                        break
+                    connection = self._deliver(connection, msg)
+                finally:
+                    self._queue.task_done()
+            self._close(connection)
+
+class ReconnectingConnection:
+    """
+    SMTP connection for sending a batch in the calling thread. A failed send
+    closes it, since the server has often dropped us, and the next send
+    opens a new one, as the worker pool does; the error is re-raised.
+    """
+
+    def __init__(self):
+        self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def send(self, msg):
+        if self._connection is None:
+            self._connection = mail.connect().__enter__()
+        try:
+            self._connection.send(msg)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        EmailWorkerPool._close(self._connection)
+        self._connection = None
+
+def get_email_pool(app=None):
+    """The app's email worker pool, created on first use"""
+    app = app or current_app._get_current_object()
+    with _pool_lock:
+        pool = app.extensions.get('email_pool')
+        if pool is None:
+            pool = app.extensions['email_pool'] = EmailWorkerPool.from_app(app)
+            atexit.register(pool.shutdown)
+    return pool
 
 def send_email(subject, recipients, template, **kwargs):
     """
@@ -47,8 +217,9 @@ def send_email(subject, recipients, template, **kwargs):
         
         # Send email asynchronously in production, synchronously in development
         if current_app.config.get('MAIL_USE_ASYNC', True) and not current_app.config.get('TESTING'):
-            # Create a new thread to send the email asynchronously
-            Thread(target=send_async_email, args=(current_app._get_current_object(), msg)).start()
+            if not get_email_pool().submit(msg):
+                current_app.logger.warning(f"Email queue full, dropping: {subject} to {recipients}")
+                return False
         else:
             mail.send(msg)
             
@@ -61,6 +232,106 @@ def send_email(subject, recipients, template, **kwargs):
             raise
         return False
 
+def _render_key(context):
+    """Hashable identity of a template context, or None if it has unhashable values"""
+    try:
+        key = tuple(sorted(context.items()))
+        hash(key)
+        return key
+    except TypeError:
+        return None
+
+def render_bulk(template, contexts):
+    """
+    Render email/<template>.html and .txt for many contexts.
+
+    Both templates are looked up once and the app's context processors run
+    once for the whole batch. Contexts identical to one already rendered
+    (e.g. a broadcast that only differs in recipients) reuse its output.
+    Yields (html, text) pairs in the order of contexts.
+    """
+    env = current_app.jinja_env
+    html_template = env.get_template(f'email/{template}.html')
+    text_template = env.get_template(f'email/{template}.txt')
+    
+    base = {}
+    current_app.update_template_context(base)
+    
+    rendered = {}
+    for context in contexts:
+        key = _render_key(context)
+        if key is not None and key in rendered:
+            yield rendered[key]
+            continue
+        full_context = {**base, **context}
+        output = (html_template.render(full_context), text_template.render(full_context))
+        if key is not None:
+            rendered[key] = output
+        yield output
+
+def send_bulk_email(template, contexts, subject=None, asynchronous=None):
+    """
+    Send one templated email per context.
+    
+    Args:
+        template (str): Template name without extension (looks in templates/email/)
+        contexts (list): One dict per email with 'recipients', an optional
+            'subject' overriding the default, and the template variables
+        subject (str): Default subject
+        asynchronous (bool): Queue on the worker pool instead of sending over
+            one connection before returning; defaults to MAIL_USE_ASYNC
+    
+    Returns the number of emails sent or queued.
+    """
+    return len(deliver_bulk_email(template, contexts, subject=subject, asynchronous=asynchronous))
+
+def deliver_bulk_email(template, contexts, subject=None, asynchronous=None):
+    """
+    Like send_bulk_email, but returns the indexes in contexts of the emails
+    that were sent or queued, so callers can tell which recipients failed.
+    """
+    if current_app.config.get('TESTING'):
+        current_app.logger.info(f"Bulk email not sent in test mode: {template} x{len(contexts)}")
+        return list(range(len(contexts)))
+    
+    messages = []
+    template_contexts = []
+    for context in contexts:
+        context = dict(context)
+        recipients = context.pop('recipients')
+        messages.append((context.pop('subject', subject), [recipients] if isinstance(recipients, str) else recipients))
+        template_contexts.append(context)
+    
+    sender = current_app.config['MAIL_DEFAULT_SENDER']
+    if asynchronous is None:
+        asynchronous = current_app.config.get('MAIL_USE_ASYNC', True)
+    pool = get_email_pool() if asynchronous else None
+    delivered = []
+    
+    def deliver(connection=None):
+        rendered = render_bulk(template, template_contexts)
+        for index, ((msg_subject, recipients), (html_body, text_body)) in enumerate(zip(messages, rendered)):
+            msg = Message(subject=msg_subject, sender=sender, recipients=recipients, html=html_body, body=text_body)
+            try:
+                if pool is not None:
+                    if not pool.submit(msg):
+                        current_app.logger.warning(f"Email queue full, dropping: {msg_subject} to {recipients}")
+                        continue
+                else:
+                    connection.send(msg)
+                delivered.append(index)
+            except Exception as e:
+                current_app.logger.error(f"Failed to send email to {recipients}: {str(e)}")
+    
+    if pool is not None:
+        deliver()
+    else:
+        with ReconnectingConnection() as connection:
+            deliver(connection)
+    
+    current_app.logger.info(f"Bulk email {template}: {len(delivered)}/{len(messages)} sent")
+    return delivered
+
 def send_welcome_email(user):
     """Send welcome email to new user"""
     login_url = f"{current_app.config.get('FRONTEND_URL', '')}/login"
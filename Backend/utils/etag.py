@@ -0,0 +1,44 @@
+import hashlib
+from flask import make_response, request
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+
+def compute_etag(*parts):
+    """Strong validator from the values a response is derived from"""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def collection_etag(query, model, *parts, related=()):
+    """
+    Validator for a filtered collection from one aggregate over its rows:
+    max(updated_at) catches edits, count and max(id) catch inserts and
+    deletes. parts should identify the request (user, query string) since
+    pages and filters share the same aggregate.
+
+    related names the many-to-one relationships embedded in each row; the
+    newest updated_at of the objects they point to is part of the same
+    aggregate, so editing an embedded object changes the validator too.
+    """
+    query = query.order_by(None)
+    columns = [func.max(model.updated_at), func.count(model.id), func.max(model.id)]
+    for name in related:
+        relationship = getattr(model, name)
+        target = aliased(relationship.property.mapper.class_)
+        query = query.outerjoin(relationship.of_type(target))
+        columns.append(func.max(target.updated_at))
+    return compute_etag(*query.with_entities(*columns).one(), *parts)
+
+def not_modified(etag):
+    """A 304 response if the client already holds etag, else None"""
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = make_response('', 304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def with_etag(rv, etag):
+    """Turn a view return value into a response carrying etag"""
+    response = make_response(rv)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,43 @@
+from collections import namedtuple
+
+Fieldset = namedtuple('Fieldset', ['fields', 'expand'])
+
+def _split(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+def parse_fieldset(args, model):
+    """
+    Read the fields= and expand= query parameters for a model's to_dict().
+
+    fields lists the top-level keys to return (None means all of them).
+    expand lists the relationships to embed: without it, the relationships
+    named in fields are embedded, or model.DEFAULT_EXPAND when fields is
+    absent too. Expanded relationships are always part of the output.
+    Raises ValueError for names the model does not know.
+    """
+    expandable = getattr(model, 'EXPANDABLE', ())
+    fields = _split(args['fields']) if 'fields' in args else None
+
+    if 'expand' in args:
+        expand = _split(args['expand'])
+    elif fields is not None:
+        expand = fields & set(expandable)
+    else:
+        expand = set(getattr(model, 'DEFAULT_EXPAND', expandable))
+
+    unknown = (fields or set()) - set(model.FIELDS) - set(expandable)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    unknown = expand - set(expandable)
+    if unknown:
+        raise ValueError(f"Cannot expand: {', '.join(sorted(unknown))}")
+
+    if fields is not None:
+        fields |= expand
+    return Fieldset(fields, frozenset(expand))
+
+def select_fields(data, fields):
+    """Keep only the requested keys of a to_dict() result"""
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key in fields}
@@ -0,0 +1,74 @@
+import math
+import sqlite3
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.045
+
+def _null_safe(fn):
+    """Wrap a math function so SQL NULLs propagate instead of raising"""
+    def wrapper(value):
+        return None if value is None else fn(value)
+    return wrapper
+
+@event.listens_for(Engine, 'connect')
+def register_sqlite_math_functions(dbapi_connection, connection_record):
+    """
+    Provide the trigonometric functions used by haversine_distance() on SQLite
+    builds compiled without SQLITE_ENABLE_MATH_FUNCTIONS. PostgreSQL ships
+    them natively.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    try:
+        dbapi_connection.execute('SELECT sin(0), asin(0), radians(0)')
+        return
+    except sqlite3.OperationalError:
+        pass
+    for name, fn in (('radians', math.radians), ('sin', math.sin), ('cos', math.cos),
+                     ('asin', math.asin), ('sqrt', math.sqrt)):
+        dbapi_connection.create_function(name, 1, _null_safe(fn), deterministic=True)
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    Get the (min_lat, max_lat, lng_ranges) box enclosing a circle.
+
+    lng_ranges holds one (min_lng, max_lng) pair, or two when the box
+    crosses the antimeridian: a circle around longitude 179.9 reaches both
+    up to 180 and on from -180. A circle over a pole spans every longitude.
+    Used as an index-friendly prefilter before the exact haversine check.
+    """
+    lat_delta = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = latitude - lat_delta, latitude + lat_delta
+    cos_lat = math.cos(math.radians(latitude))
+    if min_lat <= -90.0 or max_lat >= 90.0 or cos_lat < 1e-6:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+    
+    lng_delta = radius_km / (KM_PER_DEGREE * cos_lat)
+    min_lng, max_lng = longitude - lng_delta, longitude + lng_delta
+    if max_lng - min_lng >= 360.0:
+        lng_ranges = [(-180.0, 180.0)]
+    elif min_lng < -180.0:
+        lng_ranges = [(min_lng + 360.0, 180.0), (-180.0, max_lng)]
+    elif max_lng > 180.0:
+        lng_ranges = [(min_lng, 180.0), (-180.0, max_lng - 360.0)]
+    else:
+        lng_ranges = [(min_lng, max_lng)]
+    return min_lat, max_lat, lng_ranges
+
+def haversine_distance(lat_column, lng_column, latitude, longitude):
+    """SQL expression for the great-circle distance in kilometers to a point"""
+    sin_dlat = func.sin((func.radians(lat_column) - math.radians(latitude)) / 2)
+    sin_dlng = func.sin((func.radians(lng_column) - math.radians(longitude)) / 2)
+    a = sin_dlat * sin_dlat + \
+        math.cos(math.radians(latitude)) * func.cos(func.radians(lat_column)) * sin_dlng * sin_dlng
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(a))
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in kilometers between two points, in Python"""
+    sin_dlat = math.sin(math.radians(lat2 - lat1) / 2)
+    sin_dlng = math.sin(math.radians(lng2 - lng1) / 2)
+    a = sin_dlat * sin_dlat + \
+        math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * sin_dlng * sin_dlng
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,61 @@
+import decimal
+from enum import Enum
+from flask.json.provider import DefaultJSONProvider
+from flasgger import LazyString
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider for API responses.
+
+    Encodes with orjson when it is installed, which handles datetime, date,
+    UUID and Enum natively; Decimal and flasgger's LazyString go through
+    default(). Without orjson, or when called with arguments orjson does not
+    support, it falls back to Flask's stdlib encoder with the same default().
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, decimal.Decimal):
+            return str(o)
+        if isinstance(o, Enum):
+            return o.value
+        if isinstance(o, LazyString):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
+    def _orjson_options(self, kwargs):
+        """orjson option flags for these dumps() kwargs, or None if orjson cannot honour them"""
+        indent = kwargs.pop('indent', None)
+        sort_keys = kwargs.pop('sort_keys', self.sort_keys)
+        # orjson output is always compact UTF-8
+        kwargs.pop('ensure_ascii', None)
+        kwargs.pop('separators', None)
+        if kwargs or indent not in (None, 2):
+            return None
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None:
+            option = self._orjson_options(dict(kwargs))
+            if option is not None:
+                try:
+                    return orjson.dumps(obj, default=self.default, option=option).decode()
+                except TypeError:
+                    # e.g. integers beyond 64 bits; the stdlib encoder copes
+                    pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
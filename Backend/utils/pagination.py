@@ -0,0 +1,51 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import tuple_
+from sqlalchemy.engine import Row
+
+KeysetPage = namedtuple('KeysetPage', ['items', 'next_cursor', 'total'])
+
+def encode_cursor(created_at, id):
+    """Encode a (created_at, id) position as an opaque URL-safe token"""
+    payload = json.dumps([created_at.isoformat(), id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a token from encode_cursor(); raises ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+def wants_cursor_pagination(args):
+    """Cursor mode is opt-in: any request carrying a cursor parameter, even empty"""
+    return 'cursor' in args
+
+def keyset_paginate(query, model, cursor=None, per_page=20, include_total=False):
+    """
+    Paginate newest-first on (created_at, id) without OFFSET.
+
+    The next page starts strictly after the last row of this one, so deep
+    pages cost the same as the first one when a matching index exists.
+    COUNT(*) is only issued when include_total is set.
+    """
+    total = query.order_by(None).count() if include_total else None
+
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < tuple_(created_at, last_id))
+
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1][0] if isinstance(rows[-1], Row) else rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return KeysetPage(rows, next_cursor, total)
@@ -0,0 +1,142 @@
+import json
+import logging
+import queue
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+class MemorySubscription:
+    def __init__(self, broker, channels):
+        self._broker = broker
+        self._channels = channels
+        self._queue = queue.Queue()
+
+    def get(self, timeout=None):
+        """Wait up to timeout seconds for the next (channel, message); None on timeout"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker._unsubscribe(self)
+
+
+class MemoryPubSub:
+    """In-process broker, used for tests and single-process development"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription._queue.put((channel, message))
+        return len(subscribers)
+
+    def subscribe(self, channels):
+        subscription = MemorySubscription(self, list(channels))
+        with self._lock:
+            for channel in subscription._channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription._channels:
+                self._subscribers.get(channel, set()).discard(subscription)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub, prefix):
+        self._pubsub = pubsub
+        self._prefix = prefix
+
+    def get(self, timeout=None):
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            remaining = max(deadline - time.monotonic(), 0)
+            message = self._pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message is not None:
+                channel = message['channel'].decode()[len(self._prefix):]
+                return channel, json.loads(message['data'])
+            if remaining <= 0:
+                return None
+
+    def close(self):
+        self._pubsub.close()
+
+
+class RedisPubSub:
+    """Redis broker, fanning out across every worker process"""
+
+    def __init__(self, url, prefix='mfua:'):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def publish(self, channel, message):
+        return self._client.publish(f'{self._prefix}{channel}', json.dumps(message))
+
+    def subscribe(self, channels):
+        pubsub = self._client.pubsub()
+        pubsub.subscribe(*[f'{self._prefix}{channel}' for channel in channels])
+        return RedisSubscription(pubsub, self._prefix)
+
+
+class PubSub:
+    """
+    Flask extension wrapping the configured pub/sub broker.
+
+    PUBSUB_BACKEND selects 'redis' (using REDIS_URL) or 'memory'. Messages
+    queued with publish_after_commit() are only sent once the surrounding
+    database transaction commits, so subscribers never see rolled-back rows.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        event.listen(Session, 'after_commit', self._publish_pending)
+        event.listen(Session, 'after_rollback', self._discard_pending)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config.get('PUBSUB_BACKEND', 'redis') == 'memory':
+            self.backend = MemoryPubSub()
+        else:
+            self.backend = RedisPubSub(app.config['REDIS_URL'], prefix=app.config.get('CACHE_KEY_PREFIX', 'mfua:'))
+        app.extensions['pubsub'] = self
+
+    def publish(self, channel, message):
+        try:
+            return self.backend.publish(channel, message)
+        except Exception as e:
+            logger.warning(f"Publish to {channel} failed: {str(e)}")
+            return 0
+
+    def subscribe(self, channels):
+        return self.backend.subscribe(channels)
+
+    def publish_after_commit(self, session, channel, message):
+        session.info.setdefault('pubsub_pending', []).append((channel, message))
+
+    def _publish_pending(self, session):
+        pending = session.info.pop('pubsub_pending', [])
+        if self.backend is None:
+            return
+        for channel, message in pending:
+            self.publish(channel, message)
+
+    def _discard_pending(self, session):
+        session.info.pop('pubsub_pending', None)
+
+
+def user_channel(user_id):
+    """Channel carrying every realtime event addressed to a user"""
+    return f'user:{user_id}'
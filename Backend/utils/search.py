@@ -0,0 +1,200 @@
+import re
+from markupsafe import escape
+from sqlalchemy import DDL, column, event, func, inspect, literal_column, select, table, text
+
+# Highlight delimiters used inside SQL (private-use characters, so never
+# typed by users); swapped for <mark> tags once the surrounding text has
+# been HTML-escaped
+_START, _STOP = '\ue000', '\ue001'
+
+# Longest search query, in words
+MAX_SEARCH_TERMS = 8
+
+# Words of context around the matches in a snippet
+SNIPPET_WORDS = 24
+
+def parse_search_terms(query):
+    """
+    Split free text into lowercase search words, dropping any search syntax.
+    Raises ValueError when there is no word to search for.
+    """
+    terms = re.findall(r'\w+', query.lower())[:MAX_SEARCH_TERMS]
+    if not terms:
+        raise ValueError('Search query must contain at least one word')
+    return terms
+
+def search_document(*columns, config='english'):
+    """
+    to_tsvector() of the columns joined by spaces: the expression a
+    PostgreSQL GIN index is built on, which queries must repeat exactly
+    """
+    combined = func.coalesce(columns[0], literal_column("''"))
+    for col in columns[1:]:
+        combined = combined.op('||')(literal_column("' '")).op('||')(func.coalesce(col, literal_column("''")))
+    return func.to_tsvector(literal_column(f"'{config}'"), combined)
+
+def _mark(fragment):
+    if fragment is None:
+        return None
+    return str(escape(fragment)).replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+class TextIndex:
+    """
+    Full-text index over some text columns of a table.
+
+    On SQLite (development and tests) it is an FTS5 table named
+    <table>_fts whose rowid is the row's id, kept in step by the model's
+    write events through the row_* methods. On PostgreSQL it is a GIN index
+    on search_document() of the same columns, declared in the model's
+    __table_args__ and maintained by the database itself.
+
+    Words match by stem (English endings only, as stripped by the Porter
+    stemmer or PostgreSQL's english config) and the last word also as a
+    prefix, so results appear while a query is being typed. Columns are
+    weighted in the order given, for ranking; snippet_columns are cut down
+    to the text around the matches when highlighted, the other columns are
+    highlighted in full.
+    """
+
+    def __init__(self, source, columns, weights=None, snippet_columns=(), config='english'):
+        self.source = source
+        self.columns = tuple(columns)
+        self.weights = tuple(weights or (1.0,) * len(self.columns))
+        self.snippet_columns = tuple(snippet_columns)
+        self.config = config
+        self.name = f'{source.name}_fts'
+        self.fts = table(self.name, column('rowid'), *(column(name) for name in self.columns))
+
+        event.listen(source, 'after_create', DDL(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.name} "
+            f"USING fts5({', '.join(self.columns)}, tokenize='porter unicode61')"
+        ).execute_if(dialect='sqlite'))
+        event.listen(source, 'after_drop', DDL(f'DROP TABLE IF EXISTS {self.name}').execute_if(dialect='sqlite'))
+
+    # PostgreSQL
+
+    def _regconfig(self):
+        return literal_column(f"'{self.config}'")
+
+    def document(self):
+        return search_document(*(self.source.c[name] for name in self.columns), config=self.config)
+
+    def _tsquery(self, terms):
+        return func.to_tsquery(self._regconfig(), ' & '.join(terms[:-1] + [f'{terms[-1]}:*']))
+
+    def _weighted_document(self):
+        labels = 'ABCD'
+        order = sorted(range(len(self.columns)), key=lambda i: -self.weights[i])
+        vectors = [
+            func.setweight(
+                func.to_tsvector(self._regconfig(), func.coalesce(self.source.c[self.columns[i]], literal_column("''"))),
+                literal_column(f"'{labels[min(rank, 3)]}'")
+            )
+            for rank, i in enumerate(order)
+        ]
+        document = vectors[0]
+        for vector in vectors[1:]:
+            document = document.op('||')(vector)
+        return document
+
+    # SQLite
+
+    @staticmethod
+    def _fts_query(terms):
+        return ' '.join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+
+    def _delete(self, connection, target):
+        connection.execute(text(f'DELETE FROM {self.name} WHERE rowid = :id'), {'id': target.id})
+
+    def _insert(self, connection, target):
+        connection.execute(
+            text(f"INSERT INTO {self.name} (rowid, {', '.join(self.columns)}) "
+                 f"VALUES (:id, {', '.join(':' + name for name in self.columns)})"),
+            {'id': target.id, **{name: getattr(target, name) for name in self.columns}}
+        )
+
+    # Called from the model's after_insert, after_update and after_delete
+    # events, inside the flush's transaction
+
+    def row_inserted(self, connection, target):
+        if connection.dialect.name == 'sqlite':
+            self._insert(connection, target)
+
+    def row_updated(self, connection, target):
+        if connection.dialect.name != 'sqlite':
+            return
+        state = inspect(target)
+        if any(state.attrs[name].history.has_changes() for name in self.columns):
+            self._delete(connection, target)
+            self._insert(connection, target)
+
+    def row_deleted(self, connection, target):
+        if connection.dialect.name == 'sqlite':
+            self._delete(connection, target)
+
+    # Both
+
+    def ranked(self, dialect, terms):
+        """Select of (id, rank) for every matching row; lower ranks are better"""
+        if dialect.name == 'postgresql':
+            query = self._tsquery(terms)
+            return select(
+                self.source.c.id.label('id'),
+                (-func.ts_rank(self._weighted_document(), query)).label('rank')
+            ).where(self.document().op('@@')(query))
+        return select(
+            self.fts.c.rowid.label('id'),
+            func.bm25(literal_column(self.name), *self.weights).label('rank')
+        ).where(literal_column(self.name).op('MATCH')(self._fts_query(terms)))
+
+    def highlights(self, connection, ids, terms):
+        """
+        {id: {column: html}} for the given matching rows, with each matched
+        word wrapped in <mark> and the rest of the text HTML-escaped.
+        """
+        if not ids:
+            return {}
+        if connection.dialect.name == 'postgresql':
+            query = self._tsquery(terms)
+            fragments = [
+                func.ts_headline(
+                    self._regconfig(), func.coalesce(self.source.c[name], literal_column("''")), query,
+                    f'StartSel={_START}, StopSel={_STOP}, ' + (
+                        f'MaxWords={SNIPPET_WORDS}, MinWords={SNIPPET_WORDS // 2}'
+                        if name in self.snippet_columns else 'HighlightAll=true'
+                    )
+                ).label(name)
+                for name in self.columns
+            ]
+            statement = select(self.source.c.id, *fragments).where(self.source.c.id.in_(ids))
+        else:
+            fragments = [
+                (
+                    func.snippet(literal_column(self.name), index, _START, _STOP, '…', SNIPPET_WORDS)
+                    if name in self.snippet_columns
+                    else func.highlight(literal_column(self.name), index, _START, _STOP)
+                ).label(name)
+                for index, name in enumerate(self.columns)
+            ]
+            statement = select(self.fts.c.rowid.label('id'), *fragments).where(
+                literal_column(self.name).op('MATCH')(self._fts_query(terms)),
+                self.fts.c.rowid.in_(ids)
+            )
+        return {
+            row.id: {name: _mark(getattr(row, name)) for name in self.columns}
+            for row in connection.execute(statement)
+        }
+
+    def search(self, query, id_column, terms, limit, offset=0):
+        """
+        Run query (a Query over the indexed model) restricted to rows
+        matching terms, best first. Returns a list of (row, highlights).
+        """
+        session = query.session
+        ranked = self.ranked(session.get_bind().dialect, terms).subquery()
+        rows = query.join(ranked, ranked.c.id == id_column).order_by(
+            ranked.c.rank, id_column
+        ).limit(limit).offset(offset).all()
+        highlights = self.highlights(session.connection(), [row.id for row in rows], terms)
+        return [(row, highlights.get(row.id, {})) for row in rows]
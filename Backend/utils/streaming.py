@@ -0,0 +1,82 @@
+import csv
+import io
+from flask import Response, current_app, stream_with_context
+
+# Rows fetched per round trip and rows encoded per chunk written to the client
+STREAM_BATCH_SIZE = 1000
+
+STREAM_MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# Leading characters that make spreadsheet applications read a cell as a
+# formula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def iter_query(query, batch_size=STREAM_BATCH_SIZE):
+    """
+    Iterate a query through a server-side cursor, batch_size rows at a time.
+
+    Loaded objects are not kept by the identity map beyond their batch, so
+    memory stays flat however many rows match.
+    """
+    return query.yield_per(batch_size)
+
+def ndjson_chunks(rows, serialize, batch_size=STREAM_BATCH_SIZE):
+    """Encode rows as newline-delimited JSON, one chunk per batch_size rows"""
+    dumps = current_app.json.dumps
+    lines = []
+    for row in rows:
+        lines.append(dumps(serialize(row)))
+        if len(lines) >= batch_size:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def csv_cell(value):
+    """
+    A value as written to CSV: text that a spreadsheet would evaluate as a
+    formula is prefixed with a quote so it is shown as typed
+    """
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def csv_chunks(rows, columns, serialize, batch_size=STREAM_BATCH_SIZE):
+    """
+    Encode rows as CSV with a header row, one chunk per batch_size rows.
+    Cells are escaped with csv_cell(), since exports are opened in
+    spreadsheets.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for count, row in enumerate(rows, 1):
+        data = serialize(row)
+        writer.writerow([csv_cell(data.get(column)) for column in columns])
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def stream_query(query, fmt, serialize, columns, filename=None):
+    """
+    Stream every row of query as an NDJSON or CSV response.
+
+    serialize turns a row into a dict, columns fixes the CSV column order.
+    The request context (and with it the database session) stays open
+    until the last chunk has been sent.
+    """
+    rows = iter_query(query)
+    if fmt == 'csv':
+        chunks = csv_chunks(rows, columns, serialize)
+    else:
+        chunks = ndjson_chunks(rows, serialize)
+
+    headers = {}
+    if filename:
+        headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return Response(stream_with_context(chunks), mimetype=STREAM_MIMETYPES[fmt], headers=headers)